@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the ingestion and motion pipelines
+
+Generates synthetic videos (deterministic, cached under --data-dir),
+runs each stage on them in a fresh process against a scratch database
+and work directory, and writes the results as JSON:
+
+    python benchmarks/run_benchmarks.py --suite quick --output bench.json
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+
+Stages: frames (VideoProcessor.extract_frames), audio (extract_audio
+plus extract_audio_segments), store (the store_* writers), motion
+(MotionExtractor.process_video_frames, skipped without mediapipe) and
+end_to_end (VideoProcessor.process_task on a local file). audio and
+end_to_end need the ffmpeg binary and are skipped without it.
+
+No baseline is checked in: record one with --save-baseline on the
+machine that will run the comparisons. With --baseline the run exits
+with status 1 if any stage is slower or uses more memory than the
+baseline by more than --tolerance.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import resource
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+SCHEMA = REPO / "database" / "schema.sql"
+
+# name -> (seconds, width, height, fps, motion)
+VIDEOS = {
+    "240p_10s_static": (10, 320, 240, 30, "static"),
+    "240p_10s_high": (10, 320, 240, 30, "high"),
+    "360p_60s_moderate": (60, 640, 360, 30, "moderate"),
+    "720p_60s_high": (60, 1280, 720, 30, "high"),
+    "1080p_30s_moderate": (30, 1920, 1080, 30, "moderate"),
+}
+
+SUITES = {
+    "quick": ["240p_10s_static", "240p_10s_high"],
+    "standard": ["240p_10s_static", "360p_60s_moderate", "720p_60s_high"],
+    "full": list(VIDEOS),
+}
+
+STAGES = ["frames", "audio", "store", "motion", "end_to_end"]
+
+# Sources per motion level; noise is seeded so every run encodes the same video
+FFMPEG_SOURCES = {
+    "static": "smptebars=size={w}x{h}:rate={fps}",
+    "moderate": "testsrc2=size={w}x{h}:rate={fps}",
+    "high": "cellauto=size={w}x{h}:rate={fps}:seed=7:rule=110",
+}
+
+STORE_ROWS = 20000
+
+
+def generate_video(name, data_dir):
+    """Create (or reuse) the synthetic video for a spec"""
+    seconds, width, height, fps, motion = VIDEOS[name]
+    path = Path(data_dir) / f"{name}.mp4"
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if shutil.which("ffmpeg"):
+        source = FFMPEG_SOURCES[motion].format(w=width, h=height, fps=fps)
+        cmd = [
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "lavfi", "-i", source,
+            "-f", "lavfi", "-i", "anoisesrc=color=pink:seed=42:amplitude=0.1:sample_rate=44100",
+            "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+            "-filter_complex", "[1:a][2:a]amix=inputs=2[a]",
+            "-map", "0:v", "-map", "[a]",
+            "-t", str(seconds),
+            "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-g", str(fps * 2),
+            "-c:a", "aac",
+            str(path),
+        ]
+        subprocess.run(cmd, check=True)
+    else:
+        _generate_with_opencv(path, seconds, width, height, fps, motion)
+    return path
+
+
+def _generate_with_opencv(path, seconds, width, height, fps, motion):
+    """Video-only fallback when ffmpeg is not installed"""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(7)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for i in range(seconds * fps):
+        frame = background.copy()
+        if motion != "static":
+            speed = 4 if motion == "moderate" else 16
+            x = (i * speed) % width
+            cv2.circle(frame, (x, height // 2), max(8, height // 8), (0, 0, 255), -1)
+            if motion == "high":
+                frame[rng.integers(0, height, 500), rng.integers(0, width, 500)] = 255
+        writer.write(frame)
+    writer.release()
+
+
+def _scratch(workdir):
+    """Fresh database and work directory; returns the database path"""
+    shutil.rmtree(workdir, ignore_errors=True)
+    workdir.mkdir(parents=True)
+    db_path = workdir / "bench.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA.read_text())
+    conn.close()
+
+    os.environ["MNEMO_WORK_DIR"] = str(workdir / "work")
+    os.environ["MNEMO_CACHE"] = "0"
+    os.environ["MNEMO_STREAM_INGEST"] = "0"
+    os.environ["MNEMO_METRICS_PORT"] = "0"
+    return str(db_path)
+
+
+def _row_count(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM gapper_reports").fetchone()[0]
+    conn.close()
+    return count
+
+
+def _processor(db_path):
+    sys.path[:0] = [str(REPO / "worker"), str(REPO / "common")]
+    from video_processor import VideoProcessor
+    return VideoProcessor(db_path)
+
+
+def _queue_video(db_path, video_id, url):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO video_metadata (video_id, filename) VALUES (?, ?)", (video_id, url))
+    conn.execute("INSERT INTO processing_queue (video_id, task_type) VALUES (?, 'download')", (video_id,))
+    conn.commit()
+    conn.close()
+
+
+def run_stage(stage, video_path, workdir):
+    """Run one stage in the current process; returns the measurement dict"""
+    db_path = _scratch(Path(workdir))
+    video_id = "bench"
+    frames = None
+
+    if stage == "frames":
+        processor = _processor(db_path)
+        start = time.perf_counter()
+        frames = processor.extract_frames(video_path, video_id, sample_rate=1.0)
+        processor.storage.flush()
+        wall = time.perf_counter() - start
+
+    elif stage == "audio":
+        if not shutil.which("ffmpeg"):
+            return {"skipped": "ffmpeg not installed"}
+        processor = _processor(db_path)
+        start = time.perf_counter()
+        audio_path, _ = processor.extract_audio(video_path, video_id)
+        if audio_path:
+            processor.extract_audio_segments(audio_path, video_id, segment_duration=1.0)
+        processor.storage.flush()
+        wall = time.perf_counter() - start
+
+    elif stage == "store":
+        processor = _processor(db_path)
+        start = time.perf_counter()
+        for i in range(STORE_ROWS // 2):
+            processor.store_frame_data(video_id, i * 30, float(i), 100.0)
+            processor.store_audio_segment_data(video_id, i, float(i), 1.0, i * 16000, 16000)
+        processor.storage.flush()
+        wall = time.perf_counter() - start
+
+    elif stage == "motion":
+        try:
+            import mediapipe  # noqa: F401
+        except ImportError:
+            return {"skipped": "mediapipe not installed"}
+        processor = _processor(db_path)
+        processor.extract_frames(video_path, video_id, sample_rate=1.0)
+        processor.storage.flush()
+        setup_rows = _row_count(db_path)
+
+        sys.path.insert(0, str(REPO / "motion-extractor"))
+        from motion_extractor import MotionExtractor
+        extractor = MotionExtractor(db_path, metrics_port=0)
+        start = time.perf_counter()
+        with extractor.storage.stage(video_id, "motion", "motion_segment"):
+            extractor.process_video_frames(video_id)
+        wall = time.perf_counter() - start
+        frames = extractor.frames_processed
+        rows = _row_count(db_path) - setup_rows
+        return _measurement(wall, frames, rows)
+
+    elif stage == "end_to_end":
+        if not shutil.which("ffmpeg"):
+            return {"skipped": "ffmpeg not installed"}
+        processor = _processor(db_path)
+        _queue_video(db_path, video_id, str(video_path))
+
+        def local_copy(video_url, video_id):
+            target = processor.work_dir / f"{video_id}.mp4"
+            shutil.copy(video_url, target)
+            return target
+
+        # Offline: the "download" is a local copy of the synthetic video
+        processor.download_video = local_copy
+        start = time.perf_counter()
+        processor.process_one()
+        wall = time.perf_counter() - start
+        # process_one returns True for failed tasks too
+        status, error = _task_status(db_path)
+        if status != "completed":
+            raise RuntimeError(f"task ended {status}: {error}")
+        frames = _frame_rows(db_path)
+
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    return _measurement(wall, frames, _row_count(db_path))
+
+
+def _task_status(db_path):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT status, error_message FROM processing_queue").fetchone()
+    conn.close()
+    return row
+
+
+def _frame_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM gapper_reports WHERE gapper_type = 'frame'").fetchone()[0]
+    conn.close()
+    return count
+
+
+def _measurement(wall, frames, rows):
+    result = {
+        "wall_seconds": round(wall, 4),
+        "rows": rows,
+        "rows_per_second": round(rows / wall, 1) if wall else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if frames is not None:
+        result["frames"] = frames
+        result["frames_per_second"] = round(frames / wall, 2) if wall else None
+    return result
+
+
+def _child(stage, video_path, workdir, results):
+    try:
+        results.put(run_stage(stage, video_path, workdir))
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def measure(stage, video_path, workdir, repeat):
+    """Median-wall measurement over `repeat` fresh processes"""
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        results = context.Queue()
+        process = context.Process(target=_child, args=(stage, str(video_path), str(workdir), results))
+        process.start()
+        result = results.get()
+        process.join()
+        if "error" in result or "skipped" in result:
+            return result
+        runs.append(result)
+
+    runs.sort(key=lambda run: run["wall_seconds"])
+    median = dict(runs[len(runs) // 2])
+    median["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+    median["runs"] = [run["wall_seconds"] for run in runs]
+    return median
+
+
+def environment():
+    import cv2
+    import numpy as np
+    try:
+        commit = subprocess.run(["git", "-C", str(REPO), "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "ffmpeg": shutil.which("ffmpeg") is not None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline, as readable strings"""
+    expected = {(r["stage"], r["video"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = expected.get((result["stage"], result["video"]))
+        if not base or "wall_seconds" not in base or "wall_seconds" not in result:
+            continue
+        label = f"{result['stage']}/{result['video']}"
+        # Higher is worse for time and memory; throughput follows from wall time
+        for key in ("wall_seconds", "peak_rss_mb"):
+            if base.get(key) and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{label}: {key} {base[key]} -> {result[key]} "
+                                   f"(+{(result[key] / base[key] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--videos", nargs="+", choices=sorted(VIDEOS), help="override the suite's videos")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=str(REPO / "benchmarks" / ".data"))
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="compare against this report and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown, 0.15 = 15%%")
+    parser.add_argument("--save-baseline", help="also write the report here as the new baseline")
+    args = parser.parse_args()
+    if args.baseline and not Path(args.baseline).exists():
+        parser.error(f"baseline {args.baseline} does not exist; "
+                     f"record one first with --save-baseline {args.baseline}")
+
+    data_dir = Path(args.data_dir)
+    results = []
+    for name in args.videos or SUITES[args.suite]:
+        video_path = generate_video(name, data_dir / "videos")
+        for stage in args.stages:
+            print(f"{stage:>10} {name} ...", file=sys.stderr, flush=True)
+            result = measure(stage, video_path, data_dir / "scratch", args.repeat)
+            results.append({"stage": stage, "video": name, **result})
+    shutil.rmtree(data_dir / "scratch", ignore_errors=True)
+
+    report = {"environment": environment(), "suite": args.suite, "repeat": args.repeat, "results": results}
+
+    status = 0
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        report["regressions"] = regressions
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        status = 1 if regressions else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text)
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
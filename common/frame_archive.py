@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Packed per-video frame archive shared by the worker and motion extractor
+
+Layout of <work_dir>/<video_id>/frames/:
+    frames.pack    concatenated JPEG bytes at source resolution
+    index.npy      structured array: frame_number, timestamp, offset, length
+    frames_<level>.pack / index_<level>.npy
+                   the same for each downscaled pyramid level
+    refs.npy       near-duplicate frames stored as references: frame_number,
+                   timestamp, ref_frame (the stored frame they duplicate)
+    array.u8       optional uint8 frame array, memory-mapped on read
+    archive.json   frame count, pyramid levels and array shape
+
+Pyramid levels are named by width, with a "g" suffix for grayscale:
+"full,640,320g,160" keeps the source frame plus 640px colour, 320px
+grayscale and 160px thumbnails. Consumers ask for the smallest level
+that fits with level_for().
+
+Readers also accept the old layout of one frame_XXXXXX.jpg per frame.
+"""
+
+import json
+import logging
+from pathlib import Path
+from collections import namedtuple
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PACK_FILE = "frames.pack"
+INDEX_FILE = "index.npy"
+REFS_FILE = "refs.npy"
+ARRAY_FILE = "array.u8"
+META_FILE = "archive.json"
+
+INDEX_DTYPE = np.dtype([
+    ("frame_number", "<i8"),
+    ("timestamp", "<f8"),
+    ("offset", "<i8"),
+    ("length", "<i8"),
+])
+
+REFS_DTYPE = np.dtype([
+    ("frame_number", "<i8"),
+    ("timestamp", "<f8"),
+    ("ref_frame", "<i8"),
+])
+
+
+FULL = "full"
+
+PyramidLevel = namedtuple("PyramidLevel", "name width gray")
+
+
+def parse_pyramid(spec):
+    """'full,640,320g,160' -> levels, largest first"""
+    levels = []
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        if item == FULL:
+            levels.append(PyramidLevel(FULL, None, False))
+        else:
+            gray = item.endswith("g")
+            levels.append(PyramidLevel(item, int(item.rstrip("g")), gray))
+    if not levels:
+        raise ValueError(f"Empty frame pyramid: {spec!r}")
+    return sorted(levels, key=lambda level: -(level.width or 1 << 30))
+
+
+def level_files(name):
+    """(pack, index) file names of a pyramid level"""
+    if name == FULL:
+        return PACK_FILE, INDEX_FILE
+    return f"frames_{name}.pack", f"index_{name}.npy"
+
+
+def resize_to_width(frame, width):
+    """Downscale keeping the aspect ratio; never upscale"""
+    height, src_width = frame.shape[:2]
+    if width >= src_width:
+        return frame
+    return cv2.resize(frame, (width, round(height * width / src_width)), interpolation=cv2.INTER_AREA)
+
+
+class FrameArchiveWriter:
+    """Append frames in order; close() writes the indexes and metadata"""
+
+    def __init__(self, frames_dir, array_width=None, pyramid=FULL):
+        self.frames_dir = Path(frames_dir)
+        self.frames_dir.mkdir(parents=True, exist_ok=True)
+        self.array_width = array_width
+        self.array_shape = None
+        self.levels = parse_pyramid(pyramid) if isinstance(pyramid, str) else list(pyramid)
+        self.level_shapes = {}
+
+        # Unlink rather than truncate: files may be hard-linked into the media cache
+        for path in self.frames_dir.glob("*"):
+            if path.suffix in (".pack", ".npy", ".u8", ".json"):
+                path.unlink()
+
+        self.packs = {level.name: open(self.frames_dir / level_files(level.name)[0], "wb")
+                      for level in self.levels}
+        self.entries = {level.name: [] for level in self.levels}
+        self.refs = []
+        self.offsets = {level.name: 0 for level in self.levels}
+        self.array = open(self.frames_dir / ARRAY_FILE, "wb") if array_width else None
+
+    def encode(self, frame):
+        """JPEG bytes per level and optional array payload for one frame (thread-safe)"""
+        jpegs = {}
+        image = frame
+        for level in self.levels:
+            # Levels are largest first, so each one is resized from the previous
+            if level.width:
+                image = resize_to_width(image, level.width)
+            encoded = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if level.gray and image.ndim == 3 else image
+            ok, jpeg = cv2.imencode(".jpg", encoded)
+            if not ok:
+                raise ValueError(f"JPEG encoding failed for level {level.name}")
+            jpegs[level.name] = (jpeg.tobytes(), encoded.shape)
+        array = resize_to_width(frame, self.array_width) if self.array_width else None
+        return jpegs, array
+
+    def add(self, frame_number, timestamp, jpegs, array=None):
+        """Append one encoded frame; must be called in frame order"""
+        for name, (jpeg, shape) in jpegs.items():
+            self.packs[name].write(jpeg)
+            self.entries[name].append((frame_number, timestamp, self.offsets[name], len(jpeg)))
+            self.offsets[name] += len(jpeg)
+            self.level_shapes.setdefault(name, list(shape))
+
+        if self.array is not None:
+            if self.array_shape is None:
+                self.array_shape = array.shape
+            elif array.shape != self.array_shape:
+                array = cv2.resize(array, (self.array_shape[1], self.array_shape[0]))
+            self.array.write(np.ascontiguousarray(array, dtype=np.uint8).tobytes())
+
+    def add_reference(self, frame_number, timestamp, ref_frame):
+        """Record a sampled frame as a duplicate of an already stored frame"""
+        self.refs.append((frame_number, timestamp, ref_frame))
+
+    def _close_files(self):
+        for pack in self.packs.values():
+            pack.close()
+        if self.array is not None:
+            self.array.close()
+
+    def close(self):
+        self._close_files()
+
+        for level in self.levels:
+            np.save(self.frames_dir / level_files(level.name)[1],
+                    np.array(self.entries[level.name], dtype=INDEX_DTYPE))
+        np.save(self.frames_dir / REFS_FILE, np.array(self.refs, dtype=REFS_DTYPE))
+
+        meta = {
+            "version": 2,
+            "count": len(self.entries[self.levels[0].name]),
+            "refs": len(self.refs),
+            "levels": {
+                level.name: {"width": level.width, "gray": level.gray,
+                             "shape": self.level_shapes.get(level.name)}
+                for level in self.levels
+            },
+        }
+        if self.array_shape is not None:
+            meta["array_shape"] = list(self.array_shape)
+        (self.frames_dir / META_FILE).write_text(json.dumps(meta))
+
+    def abort(self):
+        """Close the files without writing metadata, so readers never see a partial archive"""
+        self._close_files()
+        (self.frames_dir / META_FILE).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class FrameArchive:
+    """Read-only view of a packed archive; nothing is copied until a frame is decoded"""
+
+    def __init__(self, frames_dir):
+        self.frames_dir = Path(frames_dir)
+        self.meta = json.loads((self.frames_dir / META_FILE).read_text())
+        # Version 1 archives only have the full level
+        self.levels = self.meta.get("levels", {FULL: {"width": None, "gray": False, "shape": None}})
+        self.default_level = max(self.levels, key=lambda name: self.levels[name]["width"] or 1 << 30)
+
+        self._indexes = {}
+        self._packs = {}
+        self._array = None
+        self.index = self._index(self.default_level)
+
+    @staticmethod
+    def exists(frames_dir):
+        return (Path(frames_dir) / META_FILE).exists()
+
+    def _index(self, level):
+        if level not in self._indexes:
+            self._indexes[level] = np.load(self.frames_dir / level_files(level)[1], mmap_mode="r")
+        return self._indexes[level]
+
+    def _pack(self, level):
+        if level not in self._packs:
+            pack_path = self.frames_dir / level_files(level)[0]
+            self._packs[level] = (np.memmap(pack_path, dtype=np.uint8, mode="r")
+                                  if pack_path.stat().st_size else np.zeros(0, dtype=np.uint8))
+        return self._packs[level]
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def frame_numbers(self):
+        return self.index["frame_number"]
+
+    @property
+    def timestamps(self):
+        return self.index["timestamp"]
+
+    def level_for(self, min_width=None, gray=False):
+        """Smallest stored level at least min_width wide (colour unless gray is acceptable)"""
+        candidates = [
+            name for name, level in self.levels.items()
+            if (gray or not level["gray"]) and
+               (min_width is None or level["width"] is None or level["width"] >= min_width)
+        ]
+        if not candidates:
+            return self.default_level
+        return min(candidates, key=lambda name: self.levels[name]["width"] or 1 << 30)
+
+    def jpeg(self, i, level=None):
+        level = level or self.default_level
+        entry = self._index(level)[i]
+        return self._pack(level)[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def read(self, i, level=None):
+        """Decode frame i of a level (default: the largest) to BGR, or gray for gray levels"""
+        level = level or self.default_level
+        flags = cv2.IMREAD_GRAYSCALE if self.levels[level]["gray"] else cv2.IMREAD_COLOR
+        return cv2.imdecode(self.jpeg(i, level), flags)
+
+    def array(self):
+        """(count, h, w, c) uint8 memmap of the array section, or None"""
+        if self._array is None and "array_shape" in self.meta:
+            shape = (len(self),) + tuple(self.meta["array_shape"])
+            self._array = np.memmap(self.frames_dir / ARRAY_FILE, dtype=np.uint8, mode="r", shape=shape)
+        return self._array
+
+    def references(self):
+        """Structured array of duplicate frames (empty for archives without refs)"""
+        if self.frames_dir.joinpath(REFS_FILE).exists():
+            return np.load(self.frames_dir / REFS_FILE)
+        return np.zeros(0, dtype=REFS_DTYPE)
+
+    def timeline(self):
+        """Every sampled frame in order, duplicates included
+
+        Returns (frame_number, timestamp, stored_index, duplicate_of) tuples;
+        stored_index is the archive index to decode and duplicate_of is the
+        frame number of the stored original, or None for stored frames.
+        """
+        stored = {}
+        rows = []
+        for i, entry in enumerate(self.index):
+            stored[int(entry["frame_number"])] = i
+            rows.append((int(entry["frame_number"]), float(entry["timestamp"]), i, None))
+        for ref in self.references():
+            ref_frame = int(ref["ref_frame"])
+            rows.append((int(ref["frame_number"]), float(ref["timestamp"]), stored[ref_frame], ref_frame))
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    def frames(self, level=None):
+        """Yield (frame_number, timestamp, frame) of one level in frame order"""
+        for i in range(len(self)):
+            yield int(self.index[i]["frame_number"]), float(self.index[i]["timestamp"]), self.read(i, level)
+
+    def __iter__(self):
+        return self.frames()
+
+
+class LegacyFrameDirectory:
+    """Same read interface over the old frame_XXXXXX.jpg layout"""
+
+    def __init__(self, frames_dir, fps=None):
+        self.frames_dir = Path(frames_dir)
+        self.files = sorted(self.frames_dir.glob("frame_*.jpg"))
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def frame_numbers(self):
+        return np.array([int(path.stem.split('_')[1]) for path in self.files], dtype=np.int64)
+
+    @property
+    def timestamps(self):
+        if not self.fps:
+            return np.full(len(self), np.nan)
+        return self.frame_numbers / self.fps
+
+    def level_for(self, min_width=None, gray=False):
+        return FULL
+
+    def timeline(self):
+        return [(int(frame_number), float(timestamp), i, None)
+                for i, (frame_number, timestamp) in enumerate(zip(self.frame_numbers, self.timestamps))]
+
+    def jpeg(self, i, level=None):
+        return np.fromfile(self.files[i], dtype=np.uint8)
+
+    def read(self, i, level=None):
+        return cv2.imread(str(self.files[i]))
+
+    def array(self):
+        return None
+
+    def frames(self, level=None):
+        return iter(self)
+
+    def __iter__(self):
+        timestamps = self.timestamps
+        for i, path in enumerate(self.files):
+            frame = cv2.imread(str(path))
+            if frame is None:
+                continue
+            yield int(path.stem.split('_')[1]), float(timestamps[i]), frame
+
+
+def open_frames(frames_dir, fps=None):
+    """Open a video's frames, packed or legacy; None if there are none"""
+    frames_dir = Path(frames_dir)
+    if FrameArchive.exists(frames_dir):
+        return FrameArchive(frames_dir)
+    if frames_dir.exists():
+        return LegacyFrameDirectory(frames_dir, fps)
+    return None
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Prometheus metrics for the Python services
+Each process serves /metrics on its own port (MNEMO_METRICS_PORT, 0
+disables it).
+A TaskProfiler attached as Metrics.profiler also receives every stage,
+with or without prometheus_client.
+prometheus_client also exports process_resident_memory_bytes and CPU
+time. Without prometheus_client installed every call is a no-op.
+"""
+
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+except ImportError:
+    Counter = Gauge = Histogram = start_http_server = None
+
+# Per-frame stages are milliseconds, downloads and tasks are minutes
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _collectors():
+    """Create the process-wide collectors once; the default registry rejects duplicates"""
+    global _COLLECTORS
+    if _COLLECTORS is None:
+        _COLLECTORS = {
+            "stage_seconds": Histogram(
+                "mnemo_stage_seconds", "Wall time per processing stage",
+                ["service", "stage"], buckets=STAGE_BUCKETS),
+            "frames": Counter(
+                "mnemo_frames_total", "Frames processed", ["service"]),
+            "frames_per_second": Gauge(
+                "mnemo_task_frames_per_second", "Frame throughput of the last finished task", ["service"]),
+            "tasks": Counter(
+                "mnemo_tasks_total", "Finished tasks by outcome", ["service", "outcome"]),
+            "queue_depth": Gauge(
+                "mnemo_queue_depth", "Tasks waiting for this service", ["service"]),
+            "db_rows": Counter(
+                "mnemo_db_rows_written_total", "Gapper report rows flushed to the database", ["service"]),
+            "gate_decisions": Counter(
+                "mnemo_gate_decisions_total", "Per-frame pose gate decisions", ["service", "decision"]),
+        }
+    return _COLLECTORS
+
+
+_COLLECTORS = None
+_SERVED_PORTS = set()
+
+
+class Metrics:
+    def __init__(self, service, port=0):
+        self.service = service
+        self.profiler = None
+        self.enabled = Histogram is not None
+        if not self.enabled:
+            logger.warning("prometheus_client not installed, metrics are disabled")
+            return
+
+        collectors = _collectors()
+        self.stage_seconds = collectors["stage_seconds"]
+        self.frames = collectors["frames"]
+        self.frames_per_second = collectors["frames_per_second"]
+        self.tasks = collectors["tasks"]
+        self.queue_depth = collectors["queue_depth"]
+        self.db_rows = collectors["db_rows"]
+        self.gate_decisions = collectors["gate_decisions"]
+
+        if port and port not in _SERVED_PORTS:
+            start_http_server(port)
+            _SERVED_PORTS.add(port)
+            logger.info(f"Serving metrics on :{port}/metrics")
+
+    def observe(self, stage, seconds):
+        if self.profiler is not None:
+            self.profiler.end(stage, None, seconds)
+        if self.enabled:
+            self.stage_seconds.labels(self.service, stage).observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """Observe the wall time of the block under stage"""
+        profiler = self.profiler
+        token = profiler.begin() if profiler is not None else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(stage, time.perf_counter() - start, profiler, token)
+
+    def _record(self, stage, seconds, profiler, token):
+        if profiler is not None:
+            profiler.end(stage, token, seconds)
+        if self.enabled:
+            self.stage_seconds.labels(self.service, stage).observe(seconds)
+
+    def timed_iter(self, stage, items):
+        """Yield from items, observing the time spent waiting for each one"""
+        iterator = iter(items)
+        while True:
+            profiler = self.profiler
+            token = profiler.begin() if profiler is not None else None
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self._record(stage, time.perf_counter() - start, profiler, token)
+            yield item
+
+    def count_frames(self, count=1):
+        if self.enabled:
+            self.frames.labels(self.service).inc(count)
+
+    def gate_decision(self, decision, count=1):
+        if self.enabled:
+            self.gate_decisions.labels(self.service, decision).inc(count)
+
+    def task_finished(self, outcome, frames=0, seconds=None):
+        """Count a task outcome (success, failure, skipped) and record its throughput"""
+        if not self.enabled:
+            return
+        self.tasks.labels(self.service, outcome).inc()
+        if frames and seconds:
+            self.frames_per_second.labels(self.service).set(frames / seconds)
+
+    def set_queue_depth(self, depth):
+        """Record the queue depth; set from the service loop so scrapes never touch the database"""
+        if self.enabled:
+            self.queue_depth.labels(self.service).set(depth)
+
+    def track_storage(self, storage):
+        """Time the batched gapper report writes of a Storage"""
+        def on_flush(rows, seconds):
+            self.observe("db_write", seconds)
+            if self.enabled:
+                self.db_rows.labels(self.service).inc(rows)
+
+        storage.on_flush = on_flush
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Ordered, retrying process pool for chunked work
+Jobs run in spawned processes (the services hold SQLite connections,
+lease threads and MediaPipe graphs that must not be forked) and their
+results come back in job order. A crashed child breaks the whole pool
+and fails every running job with it, so those jobs are rerun one pool
+each: only a job that fails on its own is charged an attempt.
+"""
+
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+def ordered_process_map(fn, jobs, workers, retries, label=str, in_flight=None):
+    """Yield fn(job) for every job, in order, from a pool of `workers` processes
+
+    At most in_flight jobs (default two per worker) are running or waiting
+    to be consumed. A job that raises is resubmitted; one that still fails
+    after `retries` extra attempts raises RuntimeError. label(job) names a
+    job in log messages.
+    """
+    jobs = list(jobs)
+    in_flight = in_flight or 2 * workers
+    attempts = Counter()
+    results = {}
+    running = {}
+    context = multiprocessing.get_context("spawn")
+
+    def failed(position, e):
+        attempts[position] += 1
+        if attempts[position] > retries:
+            raise RuntimeError(f"{label(jobs[position])} failed after {attempts[position]} attempts: {e}") from e
+        logger.warning(f"{label(jobs[position])} failed (attempt {attempts[position]}), retrying: {e}")
+
+    def run_alone(position):
+        logger.warning(f"Process pool broke while {label(jobs[position])} was running, rerunning it alone")
+        while position not in results:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                try:
+                    results[position] = pool.submit(fn, jobs[position]).result()
+                except Exception as e:
+                    failed(position, e)
+
+    submitted = 0
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        for position in range(len(jobs)):
+            while position not in results:
+                while submitted < len(jobs) and len(running) + len(results) < in_flight:
+                    running[submitted] = pool.submit(fn, jobs[submitted])
+                    submitted += 1
+
+                try:
+                    results[position] = running[position].result()
+                    del running[position]
+                except BrokenProcessPool:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    suspects, running = running, {}
+                    for index, future in sorted(suspects.items()):
+                        # Jobs that finished before the crash keep their results
+                        if future.done() and not future.cancelled() and future.exception() is None:
+                            results[index] = future.result()
+                        else:
+                            run_alone(index)
+                    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+                except Exception as e:
+                    failed(position, e)
+                    running[position] = pool.submit(fn, jobs[position])
+
+            yield results.pop(position)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Opt-in per-task profiling
+While a task is profiled, cProfile runs on the task thread and on every
+thread started during the task (the frame encode pool), tracemalloc
+traces allocations, and every Metrics stage records its wall time and
+net allocated bytes. stop() writes, under the profile directory:
+
+    profile.pstats   merged cProfile stats (pstats / snakeviz)
+    profile.txt      top functions by cumulative time
+    stages.json      per-stage calls, wall time and allocations, plus
+                     the top allocation sites of the task
+
+Profiling is enabled for every task with MNEMO_PROFILE=1 or per video
+with options.profile when it is queued. tracemalloc slows allocation-
+heavy stages down noticeably, so compare profiled runs with each other
+rather than with production timings.
+"""
+
+import io
+import os
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 20
+
+
+class TaskProfiler:
+    def __init__(self, label, output_dir):
+        self.label = label
+        self.output_dir = Path(output_dir)
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._profiles = []
+        self._started = None
+        self._owns_tracemalloc = False
+
+    def _thread_profile(self, frame, event, arg):
+        """First profile event of a new thread: hand the thread over to its own cProfile"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return  # Python 3.12+: the task profile already sees every thread
+        with self._lock:
+            self._profiles.append(profile)
+
+    def start(self):
+        self._started = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        threading.setprofile(self._thread_profile)
+        profile = cProfile.Profile()
+        self._profiles.append(profile)
+        profile.enable()
+
+    def begin(self):
+        """Token for a stage that starts now"""
+        return tracemalloc.get_traced_memory()[0]
+
+    def end(self, stage, token, seconds):
+        """Record a stage that began with token and took seconds"""
+        allocated = tracemalloc.get_traced_memory()[0] - token if token is not None else 0
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"calls": 0, "wall_seconds": 0.0, "net_alloc_bytes": 0})
+            entry["calls"] += 1
+            entry["wall_seconds"] += seconds
+            entry["net_alloc_bytes"] += allocated
+
+    def stop(self):
+        """Stop profiling and write the reports; returns a summary dict"""
+        threading.setprofile(None)
+        self._profiles[0].disable()
+        wall = time.perf_counter() - self._started
+
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        stats = pstats.Stats(self._profiles[0])
+        for profile in self._profiles[1:]:
+            profile.disable()
+            try:
+                stats.add(profile)
+            except TypeError:
+                pass  # a thread that never ran a profiled call
+        stats.dump_stats(self.output_dir / "profile.pstats")
+
+        text = io.StringIO()
+        pstats.Stats(str(self.output_dir / "profile.pstats"), stream=text) \
+            .sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        (self.output_dir / "profile.txt").write_text(text.getvalue())
+
+        allocations = [
+            {"site": str(stat.traceback[0]), "bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        ]
+        stages = {name: dict(entry, wall_seconds=round(entry["wall_seconds"], 4))
+                  for name, entry in sorted(self.stages.items(), key=lambda item: -item[1]["wall_seconds"])}
+        (self.output_dir / "stages.json").write_text(json.dumps({
+            "label": self.label,
+            "wall_seconds": round(wall, 4),
+            "peak_traced_bytes": peak,
+            "threads_profiled": len(self._profiles),
+            "stages": stages,
+            "top_allocations": allocations,
+        }, indent=2))
+
+        top_functions = []
+        for (filename, line, function), (_, _, _, cumulative, _) in sorted(
+                stats.stats.items(), key=lambda item: -item[1][3])[:5]:
+            top_functions.append({"function": f"{Path(filename).name}:{line}({function})",
+                                  "cumulative_seconds": round(cumulative, 4)})
+
+        logger.info(f"Wrote profile of {self.label} to {self.output_dir}")
+        return {
+            "label": self.label,
+            "wall_seconds": round(wall, 3),
+            "peak_traced_bytes": peak,
+            "stages": {name: entry["wall_seconds"] for name, entry in stages.items()},
+            "top_functions": top_functions,
+            "output_dir": str(self.output_dir),
+        }
+
+
+def profile_settings(db_path):
+    """(profile every task, root directory of the profiles)"""
+    always = os.environ.get("MNEMO_PROFILE", "0") == "1"
+    root = os.environ.get("MNEMO_PROFILE_DIR", str(Path(db_path).parent / "profiles"))
+    return always, Path(root)
+
+
+@contextmanager
+def profiled(metrics, storage, video_id, label, root):
+    """Profile the block into root/video_id/label and record a 'profile' gapper report"""
+    profiler = TaskProfiler(label, Path(root) / video_id / label)
+    metrics.profiler = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        metrics.profiler = None
+        try:
+            summary = profiler.stop()
+            slowest = next(iter(summary["stages"].items()), None)
+            storage.add_gapper_report(
+                video_id,
+                "profile",
+                0,
+                f"{label}_profile",
+                0,
+                0,
+                f"Profiled {label}: {summary['wall_seconds']:.1f}s"
+                + (f", slowest stage {slowest[0]} ({slowest[1]:.1f}s)" if slowest else ""),
+                0.0,
+                summary
+            )
+            storage.flush()
+        except Exception as e:
+            logger.error(f"Failed to write profile of {label}: {e}")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite storage layer for the Mnemo Python services
+Keeps long-lived WAL connections and batches gapper_reports inserts
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+INSERT_GAPPER_REPORT = """
+    INSERT INTO gapper_reports
+    (video_id, gapper_type, timestamp, gapper_id, start_frame,
+     end_frame, summary, importance, features)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",   # fsync on checkpoint, not on every commit
+    "PRAGMA busy_timeout = 30000",   # wait for the other service instead of failing
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",    # 16 MB page cache per connection
+    "PRAGMA foreign_keys = ON",
+)
+
+
+class Storage:
+    """Persistent connections plus a buffered gapper_reports writer
+
+    Rows added with add_gapper_report are written with executemany, one
+    transaction per batch, once batch_size rows are pending or
+    flush_interval seconds have passed. Wrap a processing stage in
+    stage() so its remaining rows are flushed when it finishes and its
+    rows are removed again if it fails.
+    """
+
+    def __init__(self, db_path="/data/video_memory.db", batch_size=None, flush_interval=None):
+        self.db_path = db_path
+        self.batch_size = batch_size or int(os.environ.get("MNEMO_DB_BATCH_SIZE", "500"))
+        self.flush_interval = flush_interval or float(os.environ.get("MNEMO_DB_FLUSH_INTERVAL", "2.0"))
+
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        # Optional callback(rows, seconds) after each batch is written
+        self.on_flush = None
+        # Optional check(conn) inside each batch's transaction; False drops the batch
+        self.write_guard = None
+
+    def connection(self):
+        """Return this thread's long-lived connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, rolled back on error"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def execute(self, sql, params=()):
+        """Run a single statement in its own transaction"""
+        with self.transaction() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def query_one(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def query_all(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def add_gapper_report(self, video_id, gapper_type, timestamp, gapper_id, start_frame,
+                          end_frame, summary, importance, features):
+        """Buffer one gapper_reports row, flushing by size or age"""
+        if not isinstance(features, str):
+            features = json.dumps(features)
+
+        row = (video_id, gapper_type, timestamp, gapper_id, start_frame,
+               end_frame, summary, importance, features)
+
+        with self._lock:
+            self._pending.append(row)
+            due = (len(self._pending) >= self.batch_size or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows in one transaction"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+
+        if not rows:
+            return 0
+
+        start = time.perf_counter()
+        with self.transaction() as conn:
+            if self.write_guard is not None and not self.write_guard(conn):
+                logger.warning(f"Dropped {len(rows)} buffered rows rejected by the write guard")
+                return 0
+            conn.executemany(INSERT_GAPPER_REPORT, rows)
+
+        if self.on_flush:
+            self.on_flush(len(rows), time.perf_counter() - start)
+        return len(rows)
+
+    def discard(self, video_id, gapper_types):
+        """Drop buffered and written rows of the given types for a video"""
+        with self._lock:
+            self._pending = [
+                row for row in self._pending
+                if not (row[0] == video_id and row[1] in gapper_types)
+            ]
+
+        placeholders = ", ".join("?" for _ in gapper_types)
+        self.execute(
+            f"DELETE FROM gapper_reports WHERE video_id = ? AND gapper_type IN ({placeholders})",
+            (video_id, *gapper_types)
+        )
+
+    @contextmanager
+    def stage(self, video_id, *gapper_types):
+        """Scope one processing stage: flush on success, discard its rows on failure"""
+        try:
+            yield self
+        except BaseException:
+            logger.warning(f"Stage {'/'.join(gapper_types)} failed for {video_id}, discarding its rows")
+            self.discard(video_id, gapper_types)
+            raise
+        self.flush()
+
+    def release(self):
+        """Close the calling thread's connection; call before a short-lived thread exits"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def close(self):
+        """Flush pending rows and close every connection"""
+        self.flush()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Disk quota and retention for the shared work directory
+Every <work_dir>/<video_id> is tracked in work_artifacts with its size
+and last use, and in work_artifact_refs with one row per stage that
+still needs it. A stage holds an active ref while it runs; when the
+worker publishes a video it hands it over to the pending downstream
+consumers, and the directory is deleted once the last ref is released.
+Under disk pressure, artifacts without an active ref are evicted least
+recently used first: idle ones before those a consumer is still waiting
+for. The latter are recorded in work_evictions so the consumer can ask
+for the video to be extracted again.
+"""
+
+import os
+import time
+import shutil
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORK_DIR = "/tmp/mnemo_work"
+
+WORK_DIR_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS work_artifacts (
+        video_id TEXT PRIMARY KEY,
+        size_bytes INTEGER NOT NULL DEFAULT 0,
+        last_used INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS work_artifact_refs (
+        video_id TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        active INTEGER NOT NULL DEFAULT 0,
+        updated_at INTEGER NOT NULL,
+        PRIMARY KEY (video_id, stage)
+    );
+    CREATE TABLE IF NOT EXISTS work_evictions (
+        video_id TEXT PRIMARY KEY,
+        stages TEXT NOT NULL,
+        evicted_at INTEGER NOT NULL
+    );
+"""
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def dir_size(path):
+    """Bytes used by the regular files under path"""
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return size
+
+
+class WorkDir:
+    def __init__(self, storage, root=None, quota_bytes=None, min_free_bytes=None, consumers=None):
+        self.storage = storage
+        self.root = Path(root or os.environ.get("MNEMO_WORK_DIR", DEFAULT_WORK_DIR))
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.quota_bytes = quota_bytes or int(os.environ.get("MNEMO_WORK_QUOTA_MB", "4096")) * 1024 * 1024
+        self.min_free_bytes = min_free_bytes or int(os.environ.get("MNEMO_WORK_MIN_FREE_MB", "1024")) * 1024 * 1024
+        # Stages that read a video's artifacts after the worker has finished with it
+        if consumers is None:
+            consumers = os.environ.get("MNEMO_WORK_CONSUMERS", "motion").split(",")
+        self.consumers = [stage.strip() for stage in consumers if stage.strip()]
+        # An active ref older than this belongs to a process that died mid-stage
+        self.active_timeout_ms = int(float(os.environ.get("MNEMO_WORK_ACTIVE_HOURS", "6")) * 3600 * 1000)
+
+        self.storage.connection().executescript(WORK_DIR_SCHEMA)
+
+    def video_dir(self, video_id):
+        return self.root / video_id
+
+    def hold(self, video_id, stage, active=False):
+        """Record that stage needs the video's artifacts (active while it is running)"""
+        timestamp = now_ms()
+        with self.storage.transaction() as conn:
+            conn.execute("""
+                INSERT INTO work_artifacts (video_id, last_used) VALUES (?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET last_used = excluded.last_used
+            """, (video_id, timestamp))
+            conn.execute("""
+                INSERT OR REPLACE INTO work_artifact_refs (video_id, stage, active, updated_at)
+                VALUES (?, ?, ?, ?)
+            """, (video_id, stage, int(active), timestamp))
+
+    def acquire(self, video_id, stage):
+        """Mark stage as running on the video; its artifacts cannot be evicted meanwhile"""
+        self.hold(video_id, stage, active=True)
+
+    def publish(self, video_id, stage):
+        """Hand a finished video over to the downstream consumers, then release stage"""
+        size = dir_size(self.video_dir(video_id))
+        with self.storage.transaction() as conn:
+            conn.execute(
+                "UPDATE work_artifacts SET size_bytes = ?, last_used = ? WHERE video_id = ?",
+                (size, now_ms(), video_id)
+            )
+            # Fresh artifacts replace any that were evicted
+            conn.execute("DELETE FROM work_evictions WHERE video_id = ?", (video_id,))
+        for consumer in self.consumers:
+            if consumer != stage:
+                self.hold(video_id, consumer)
+        self.release(video_id, stage)
+
+    def release(self, video_id, stage):
+        """Drop stage's ref; the artifacts are deleted once no stage needs them"""
+        with self.storage.transaction() as conn:
+            conn.execute("DELETE FROM work_artifact_refs WHERE video_id = ? AND stage = ?", (video_id, stage))
+            remaining = conn.execute(
+                "SELECT COUNT(*) FROM work_artifact_refs WHERE video_id = ?", (video_id,)
+            ).fetchone()[0]
+
+        if not remaining:
+            self.remove(video_id)
+
+    def remove(self, video_id):
+        """Delete a video's artifacts and downloaded file"""
+        with self.storage.transaction() as conn:
+            conn.execute("DELETE FROM work_artifact_refs WHERE video_id = ?", (video_id,))
+            conn.execute("DELETE FROM work_artifacts WHERE video_id = ?", (video_id,))
+        shutil.rmtree(self.video_dir(video_id), ignore_errors=True)
+        (self.root / f"{video_id}.mp4").unlink(missing_ok=True)
+        logger.info(f"Removed work artifacts of {video_id}")
+
+    def usage(self):
+        """Bytes recorded for published artifacts"""
+        row = self.storage.query_one("SELECT COALESCE(SUM(size_bytes), 0) FROM work_artifacts")
+        return row[0]
+
+    def free_bytes(self):
+        return shutil.disk_usage(self.root).free
+
+    def under_pressure(self):
+        return self.usage() > self.quota_bytes or self.free_bytes() < self.min_free_bytes
+
+    def evicted(self, video_id):
+        """Whether the video's artifacts were evicted before a pending stage used them"""
+        row = self.storage.query_one("SELECT 1 FROM work_evictions WHERE video_id = ?", (video_id,))
+        return row is not None
+
+    def evict(self):
+        """Evict inactive artifacts until out of pressure
+
+        Artifacts no stage is waiting for go first, least recently used
+        first; those with a pending consumer only as a last resort.
+        """
+        candidates = self.storage.query_all("""
+            SELECT a.video_id, a.size_bytes,
+                   (SELECT GROUP_CONCAT(r.stage) FROM work_artifact_refs r WHERE r.video_id = a.video_id)
+                   AS pending
+            FROM work_artifacts a
+            WHERE NOT EXISTS (
+                SELECT 1 FROM work_artifact_refs r
+                WHERE r.video_id = a.video_id AND r.active = 1 AND r.updated_at > ?
+            )
+            ORDER BY pending IS NOT NULL, a.last_used ASC
+        """, (now_ms() - self.active_timeout_ms,))
+
+        evicted = 0
+        for video_id, size, pending in candidates:
+            if not self.under_pressure():
+                break
+            if pending:
+                logger.warning(f"Evicting {video_id} ({size} bytes) before {pending} used it")
+                self.storage.execute(
+                    "INSERT OR REPLACE INTO work_evictions (video_id, stages, evicted_at) VALUES (?, ?, ?)",
+                    (video_id, pending, now_ms())
+                )
+            else:
+                logger.info(f"Evicting {video_id} ({size} bytes)")
+            self.remove(video_id)
+            evicted += 1
+        return evicted
+
+    def has_room(self):
+        """Whether a new download may start, evicting idle artifacts if needed"""
+        if self.under_pressure():
+            self.evict()
+        return not self.under_pressure()
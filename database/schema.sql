@@ -74,7 +74,8 @@ CREATE TABLE IF NOT EXISTS video_metadata (
     height INTEGER,
     created_at INTEGER DEFAULT (strftime('%s', 'now') * 1000),
     processed_at INTEGER,
-    status TEXT DEFAULT 'pending' -- pending, processing, completed, failed
+    status TEXT DEFAULT 'pending', -- pending, processing, preview (quick level), completed, failed
+    processing_level TEXT DEFAULT 'standard' -- level the stored frames were extracted at
 );
 
 -- Processing queue table (for orchestrator)
@@ -89,9 +90,57 @@ CREATE TABLE IF NOT EXISTS processing_queue (
     started_at INTEGER,
     completed_at INTEGER,
     error_message TEXT,
+    processing_level TEXT DEFAULT 'standard', -- quick (keyframe preview), standard
+    profile INTEGER DEFAULT 0, -- 1: write a CPU/allocation profile of the task
+    lease_expiries INTEGER DEFAULT 0, -- times a worker's lease ran out; failed after MNEMO_MAX_LEASE_EXPIRIES
     FOREIGN KEY (video_id) REFERENCES video_metadata(video_id)
 );
 
 -- Index for queue operations
 CREATE INDEX IF NOT EXISTS idx_queue_status 
-ON processing_queue(status, priority DESC, created_at);
\ No newline at end of file
+ON processing_queue(status, priority DESC, created_at);
+-- Content-addressed media cache (managed by the video worker)
+CREATE TABLE IF NOT EXISTS media_cache_entries (
+    content_hash TEXT PRIMARY KEY, -- sha256 of the downloaded media
+    source_video_id TEXT NOT NULL, -- video whose artifacts and rows are reused
+    metadata TEXT NOT NULL, -- JSON video metadata
+    frame_count INTEGER NOT NULL,
+    audio_segments INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    last_used INTEGER NOT NULL -- Unix timestamp in milliseconds, for LRU eviction
+);
+
+CREATE TABLE IF NOT EXISTS media_cache_urls (
+    url_key TEXT PRIMARY KEY, -- normalized video URL
+    content_hash TEXT NOT NULL
+);
+
+-- Per-video motion landmarks (written by the motion extractor), zlib-compressed
+-- float16 arrays of consecutive frames; NaN where a part was not detected
+CREATE TABLE IF NOT EXISTS landmark_chunks (
+    video_id TEXT NOT NULL,
+    start_frame INTEGER NOT NULL,
+    end_frame INTEGER NOT NULL,
+    frame_count INTEGER NOT NULL,
+    frames BLOB NOT NULL, -- int64 frame numbers
+    detected BLOB NOT NULL, -- bool: pose_data was not None
+    body BLOB NOT NULL, -- (frames, 33, 4) x, y, z, visibility
+    hands BLOB NOT NULL, -- (frames, 2, 21, 3) left, right
+    extras BLOB NOT NULL, -- (frames, 2) face landmark count, segmentation coverage
+    PRIMARY KEY (video_id, start_frame)
+);
+
+-- Work directory retention (shared by the video worker and motion extractor)
+CREATE TABLE IF NOT EXISTS work_artifacts (
+    video_id TEXT PRIMARY KEY, -- <work_dir>/<video_id>
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    last_used INTEGER NOT NULL -- Unix timestamp in milliseconds, for LRU eviction
+);
+
+CREATE TABLE IF NOT EXISTS work_artifact_refs (
+    video_id TEXT NOT NULL,
+    stage TEXT NOT NULL, -- worker, motion, ...
+    active INTEGER NOT NULL DEFAULT 0, -- 1 while the stage is running on the video
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (video_id, stage)
+);
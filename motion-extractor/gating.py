@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Cheap per-frame gate in front of pose inference
+Each stored frame is compared, as a small grayscale thumbnail, with the
+last frame that was actually examined. A frame that barely changed
+reuses the previous result: its pose is carried over, or it is recorded
+as empty if nobody was there. After an empty frame the "hog" mode also
+asks OpenCV's HOG people detector before paying for a full inference.
+Every max_carry gated frames the gate lets one through regardless, so
+slow drift is still picked up.
+
+MNEMO_POSE_GATE: off (default), diff, or hog
+"""
+
+import os
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GATE_MODES = ("off", "diff", "hog")
+THUMB_WIDTH = 64
+HOG_WIDTH = 400
+
+INFERRED = "inferred"
+CARRIED = "carried"
+EMPTY = "empty"
+DUPLICATE = "duplicate"
+
+
+def gate_settings():
+    """Gate mode, static threshold (mean gray level difference) and carry limit from the environment"""
+    mode = os.environ.get("MNEMO_POSE_GATE", "off")
+    if mode not in GATE_MODES:
+        logger.warning(f"Unknown MNEMO_POSE_GATE {mode!r}, gating disabled")
+        mode = "off"
+    if mode == "hog" and not hasattr(cv2, "HOGDescriptor"):
+        logger.warning("OpenCV built without objdetect, using the diff gate")
+        mode = "diff"
+    static_diff = float(os.environ.get("MNEMO_GATE_STATIC_DIFF", "1.5"))
+    max_carry = int(os.environ.get("MNEMO_GATE_MAX_CARRY", "5"))
+    return mode, static_diff, max_carry
+
+
+class PoseGate:
+    def __init__(self, mode="diff", static_diff=1.5, max_carry=5):
+        self.static_diff = static_diff
+        self.max_carry = max_carry
+        self.reference = None
+        self.gated = 0
+        self.hog = None
+        if mode == "hog":
+            self.hog = cv2.HOGDescriptor()
+            self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def _thumbnail(self, frame):
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height = max(1, round(gray.shape[0] * THUMB_WIDTH / gray.shape[1]))
+        return cv2.resize(gray, (THUMB_WIDTH, height), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def person_present(self, frame):
+        """HOG people detector on a downscaled frame"""
+        scale = min(1.0, HOG_WIDTH / frame.shape[1])
+        if scale < 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        rects, _ = self.hog.detectMultiScale(frame, winStride=(8, 8))
+        return len(rects) > 0
+
+    def decide(self, frame, previous_pose):
+        """INFERRED (run the model), CARRIED (reuse previous_pose) or EMPTY (no person)"""
+        thumb = self._thumbnail(frame)
+        reference, self.reference = self.reference, thumb
+
+        if reference is not None and reference.shape == thumb.shape and self.gated < self.max_carry:
+            if np.abs(thumb - reference).mean() < self.static_diff:
+                # Compare later frames with the one whose result is being reused
+                self.reference = reference
+                self.gated += 1
+                return CARRIED if previous_pose else EMPTY
+
+        if previous_pose is None and self.hog is not None and self.gated < self.max_carry:
+            if not self.person_present(frame):
+                self.gated += 1
+                return EMPTY
+
+        self.gated = 0
+        return INFERRED
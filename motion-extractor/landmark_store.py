@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Binary landmark storage in landmark_chunks
+A chunk holds the landmarks of consecutive motion frames as zlib-
+compressed float16 arrays: body (frames x 33 x 4: x, y, z, visibility),
+hands (frames x 2 x 21 x 3: left, right) and extras (frames x 2: face
+landmark count, segmentation coverage), with NaN where a part was not
+detected. float16 keeps normalized coordinates to about 1/2000 of the
+frame. gapper_reports only keeps each frame's summary, so range reads
+no longer parse per-frame JSON.
+"""
+
+import zlib
+import logging
+from collections import namedtuple
+import numpy as np
+
+from landmarks import NUM_LANDMARKS, POSE_LANDMARK_NAMES
+
+logger = logging.getLogger(__name__)
+
+HAND_POINTS = 21
+HANDS = ("left_hand", "right_hand")
+
+LANDMARK_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS landmark_chunks (
+        video_id TEXT NOT NULL,
+        start_frame INTEGER NOT NULL,
+        end_frame INTEGER NOT NULL,
+        frame_count INTEGER NOT NULL,
+        frames BLOB NOT NULL,
+        detected BLOB NOT NULL,
+        body BLOB NOT NULL,
+        hands BLOB NOT NULL,
+        extras BLOB NOT NULL,
+        PRIMARY KEY (video_id, start_frame)
+    );
+"""
+
+# Decoded landmarks of a frame range; detected is False where pose_data was None
+LandmarkRange = namedtuple("LandmarkRange", "frame_numbers detected body hands extras")
+
+
+def _pack(array):
+    return zlib.compress(np.ascontiguousarray(array).tobytes(), 1)
+
+
+def _unpack(blob, dtype, shape):
+    return np.frombuffer(zlib.decompress(blob), dtype=dtype).reshape(shape)
+
+
+def encode(pose_datas):
+    """pose_data dicts (or None) -> (detected, body, hands, extras) arrays"""
+    count = len(pose_datas)
+    detected = np.zeros(count, dtype=bool)
+    body = np.full((count, NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    hands = np.full((count, len(HANDS), HAND_POINTS, 3), np.nan, dtype=np.float32)
+    extras = np.full((count, 2), np.nan, dtype=np.float32)
+
+    for i, pose_data in enumerate(pose_datas):
+        if pose_data is None:
+            continue
+        detected[i] = True
+        for idx, name in enumerate(POSE_LANDMARK_NAMES):
+            landmark = pose_data.get("pose", {}).get(name)
+            if landmark:
+                body[i, idx] = (landmark["x"], landmark["y"], landmark["z"], landmark["visibility"])
+        for h, side in enumerate(HANDS):
+            for p, landmark in enumerate((pose_data.get(side) or {}).values()):
+                hands[i, h, p] = (landmark["x"], landmark["y"], landmark["z"])
+        if "face" in pose_data:
+            extras[i, 0] = pose_data["face"]["landmark_count"]
+        if "segmentation" in pose_data:
+            extras[i, 1] = pose_data["segmentation"]["coverage"]
+
+    return detected, body, hands, extras
+
+
+def pose_data(landmarks, i):
+    """Frame i of a LandmarkRange as the pose_data dict it was stored from (at float16 precision)"""
+    if not landmarks.detected[i]:
+        return None
+
+    data = {}
+    body = landmarks.body[i].astype(float)
+    if not np.isnan(body[:, 0]).all():
+        data["pose"] = {
+            name: dict(zip(("x", "y", "z", "visibility"), body[idx]))
+            for idx, name in enumerate(POSE_LANDMARK_NAMES) if not np.isnan(body[idx, 0])
+        }
+    face_count, coverage = landmarks.extras[i].astype(float)
+    if not np.isnan(face_count):
+        data["face"] = {"landmark_count": int(face_count), "detected": True}
+    for h, side in enumerate(HANDS):
+        points = landmarks.hands[i, h].astype(float)
+        if not np.isnan(points[:, 0]).all():
+            data[side] = {f"point_{p}": dict(zip(("x", "y", "z"), points[p])) for p in range(HAND_POINTS)}
+    if not np.isnan(coverage):
+        data["segmentation"] = {"coverage": coverage}
+    return data or None
+
+
+class LandmarkStore:
+    def __init__(self, storage):
+        self.storage = storage
+        self.storage.connection().executescript(LANDMARK_SCHEMA)
+
+    def delete(self, video_id):
+        self.storage.execute("DELETE FROM landmark_chunks WHERE video_id = ?", (video_id,))
+
+    def write(self, video_id, frame_numbers, pose_datas):
+        """Store one chunk of consecutive frames; returns its compressed size in bytes"""
+        if not frame_numbers:
+            return 0
+
+        detected, body, hands, extras = encode(pose_datas)
+        blobs = (
+            _pack(np.asarray(frame_numbers, dtype=np.int64)),
+            _pack(detected),
+            _pack(body.astype(np.float16)),
+            _pack(hands.astype(np.float16)),
+            _pack(extras.astype(np.float16)),
+        )
+        self.storage.execute("""
+            INSERT OR REPLACE INTO landmark_chunks
+            (video_id, start_frame, end_frame, frame_count, frames, detected, body, hands, extras)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (video_id, int(frame_numbers[0]), int(frame_numbers[-1]), len(frame_numbers), *blobs))
+        return sum(len(blob) for blob in blobs)
+
+    def load(self, video_id, start_frame=None, end_frame=None):
+        """LandmarkRange of the frames in [start_frame, end_frame] (inclusive, None = open)"""
+        rows = self.storage.query_all("""
+            SELECT frame_count, frames, detected, body, hands, extras FROM landmark_chunks
+            WHERE video_id = ? AND end_frame >= ? AND start_frame <= ?
+            ORDER BY start_frame
+        """, (video_id,
+              start_frame if start_frame is not None else -1,
+              end_frame if end_frame is not None else 1 << 62))
+
+        parts = [[], [], [], [], []]
+        for count, frames, detected, body, hands, extras in rows:
+            parts[0].append(_unpack(frames, np.int64, (count,)))
+            parts[1].append(_unpack(detected, bool, (count,)))
+            parts[2].append(_unpack(body, np.float16, (count, NUM_LANDMARKS, 4)))
+            parts[3].append(_unpack(hands, np.float16, (count, len(HANDS), HAND_POINTS, 3)))
+            parts[4].append(_unpack(extras, np.float16, (count, 2)))
+
+        if not rows:
+            return LandmarkRange(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool),
+                                 np.zeros((0, NUM_LANDMARKS, 4), dtype=np.float16),
+                                 np.zeros((0, len(HANDS), HAND_POINTS, 3), dtype=np.float16),
+                                 np.zeros((0, 2), dtype=np.float16))
+
+        landmarks = LandmarkRange(*(np.concatenate(part) for part in parts))
+        keep = np.ones(len(landmarks.frame_numbers), dtype=bool)
+        if start_frame is not None:
+            keep &= landmarks.frame_numbers >= start_frame
+        if end_frame is not None:
+            keep &= landmarks.frame_numbers <= end_frame
+        return LandmarkRange(*(array[keep] for array in landmarks))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Array-backed body landmark sequence
+Poses are kept as one (frames x 33 x 4) float32 array of x, y, z and
+visibility with a per-landmark presence mask, instead of a dict per
+frame. Motion features (per-joint velocities, total movement, action
+hints) are computed over whole frame ranges with NumPy; pose_dict() and
+features_dict() give the name-indexed dict view for code that stores or
+reads the per-frame shape. keep_last() drops processed frames, so a
+sequence fed block by block stays bounded.
+
+MotionSegmenter turns the per-frame moving flags and hints into motion
+segments online, holding only counters for the open segment.
+
+MediaPipe landmarks are float32, so storing them as float32 loses
+nothing; differences are taken in float64 like the dict version did.
+"""
+
+from collections import Counter, namedtuple
+import numpy as np
+
+POSE_LANDMARK_NAMES = [
+    "nose", "left_eye_inner", "left_eye", "left_eye_outer",
+    "right_eye_inner", "right_eye", "right_eye_outer",
+    "left_ear", "right_ear", "mouth_left", "mouth_right",
+    "left_shoulder", "right_shoulder", "left_elbow",
+    "right_elbow", "left_wrist", "right_wrist",
+    "left_pinky", "right_pinky", "left_index",
+    "right_index", "left_thumb", "right_thumb",
+    "left_hip", "right_hip", "left_knee",
+    "right_knee", "left_ankle", "right_ankle",
+    "left_heel", "right_heel", "left_foot_index",
+    "right_foot_index",
+]
+LANDMARK_INDEX = {name: idx for idx, name in enumerate(POSE_LANDMARK_NAMES)}
+NUM_LANDMARKS = len(POSE_LANDMARK_NAMES)
+
+# Bit i of a frame's hint mask is ACTION_HINTS[i]
+ACTION_HINTS = ("left_arm_raised", "right_arm_raised", "possible_jump", "walking_or_running")
+
+# Frames moving more than this (summed joint displacement) belong to a motion segment
+MOVEMENT_THRESHOLD = 0.02
+MIN_SEGMENT_FRAMES = 4
+
+_L = LANDMARK_INDEX
+
+MotionFeatures = namedtuple("MotionFeatures", "start has_features velocities valid total hints")
+
+# hint_counts: Counter of action hint name -> moving frames showing it
+MotionSegment = namedtuple("MotionSegment", "start_frame end_frame frames hint_counts")
+
+
+class LandmarkSequence:
+    def __init__(self, capacity=256):
+        self.landmarks = np.zeros((capacity, NUM_LANDMARKS, 4), dtype=np.float32)
+        self.mask = np.zeros((capacity, NUM_LANDMARKS), dtype=bool)
+        self.detected = np.zeros(capacity, dtype=bool)  # pose_data was not None
+        self.frame_numbers = np.zeros(capacity, dtype=np.int64)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = max(1, len(self.frame_numbers)) * 2
+        for name in ("landmarks", "mask", "detected", "frame_numbers"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def append(self, frame_number, pose_data):
+        """Add one frame's pose_data dict (or None); returns its index"""
+        if self.count == len(self.frame_numbers):
+            self._grow()
+
+        i = self.count
+        self.frame_numbers[i] = frame_number
+        self.detected[i] = pose_data is not None
+        self.mask[i] = False
+        for name, landmark in (pose_data or {}).get("pose", {}).items():
+            idx = LANDMARK_INDEX.get(name)
+            if idx is not None:
+                self.landmarks[i, idx] = (landmark["x"], landmark["y"], landmark["z"],
+                                          landmark.get("visibility", 0.0))
+                self.mask[i, idx] = True
+        self.count += 1
+        return i
+
+    def keep_last(self, count):
+        """Forget all but the last count frames; indices restart at 0"""
+        count = min(count, self.count)
+        start = self.count - count
+        for name in ("landmarks", "mask", "detected", "frame_numbers"):
+            array = getattr(self, name)
+            array[:count] = array[start:self.count]
+        self.count = count
+
+    def pose_dict(self, i):
+        """Name-indexed view of frame i's body landmarks, or None"""
+        if not self.mask[i].any():
+            return None
+        return {"pose": {
+            POSE_LANDMARK_NAMES[idx]: dict(zip(("x", "y", "z", "visibility"),
+                                               map(float, self.landmarks[i, idx])))
+            for idx in np.flatnonzero(self.mask[i])
+        }}
+
+    def motion_features(self, start=0, stop=None):
+        """Features of frames [start, stop) against their predecessors, as arrays"""
+        stop = self.count if stop is None else stop
+        index = np.arange(start, stop)
+        previous = np.maximum(index - 1, 0)
+
+        # Features exist when there is a previous frame whose pose_data was not None
+        has_features = (index > 0) & self.detected[previous]
+
+        current = self.landmarks[start:stop, :, :3].astype(np.float64)
+        before = self.landmarks[previous, :, :3].astype(np.float64)
+        valid = self.mask[start:stop] & self.mask[previous] & has_features[:, None]
+        velocities = np.where(valid, np.sqrt(((current - before) ** 2).sum(axis=2)), 0.0)
+        total = velocities.sum(axis=1)
+
+        y = self.landmarks[start:stop, :, 1]
+        mask = self.mask[start:stop]
+
+        def raised(wrist, shoulder):
+            return mask[:, _L[wrist]] & mask[:, _L[shoulder]] & (y[:, _L[wrist]] < y[:, _L[shoulder]])
+
+        def velocity(joint):
+            return velocities[:, _L[joint]]
+
+        hints = (
+            raised("left_wrist", "left_shoulder") * 1
+            | raised("right_wrist", "right_shoulder") * 2
+            | ((velocity("left_ankle") > 0.1) | (velocity("right_ankle") > 0.1)) * 4
+            | ((velocity("left_knee") > 0.05) & (velocity("right_knee") > 0.05)) * 8
+        ).astype(np.uint8)
+        # Frames without pose_data have no features beyond motion_detected=False
+        hints[~self.detected[start:stop]] = 0
+
+        return MotionFeatures(start, has_features, velocities, valid, total, hints)
+
+    def features_dict(self, features, i):
+        """Dict view of frame i's motion features, as stored per frame (None without a predecessor)"""
+        j = i - features.start
+        if not features.has_features[j]:
+            return None
+        if not self.detected[i]:
+            return {"motion_detected": False}
+        return {
+            "motion_detected": True,
+            "joint_velocities": {POSE_LANDMARK_NAMES[idx]: float(features.velocities[j, idx])
+                                 for idx in np.flatnonzero(features.valid[j])},
+            "total_movement": float(features.total[j]),
+            "action_hints": hint_names(features.hints[j]),
+        }
+
+    def moving(self, features):
+        """Frames of a feature range that count as motion (moved more than MOVEMENT_THRESHOLD)"""
+        detected = self.detected[features.start:features.start + len(features.total)]
+        return features.has_features & detected & (features.total > MOVEMENT_THRESHOLD)
+
+
+def hint_names(mask):
+    return [name for bit, name in enumerate(ACTION_HINTS) if mask >> bit & 1]
+
+
+class MotionSegmenter:
+    """Online motion segmentation: feed frames in order, get each segment when it closes
+
+    A segment is a run of at least MIN_SEGMENT_FRAMES moving frames and
+    closes at the first frame that is not moving. A segment still open
+    when the video ends is not reported.
+    """
+
+    def __init__(self, min_frames=MIN_SEGMENT_FRAMES):
+        self.min_frames = min_frames
+        self.start_frame = None
+        self.end_frame = None
+        self.frames = 0
+        self.hint_counts = Counter()
+
+    def update(self, frame_number, moving, hints=0):
+        """Add one frame; returns the MotionSegment it closes, if any"""
+        if moving:
+            if self.start_frame is None:
+                self.start_frame = frame_number
+            self.end_frame = frame_number
+            self.frames += 1
+            self.hint_counts.update(hint_names(hints))
+            return None
+
+        closed = None
+        if self.start_frame is not None and self.frames >= self.min_frames:
+            closed = MotionSegment(self.start_frame, self.end_frame, self.frames, self.hint_counts)
+        self.start_frame = self.end_frame = None
+        self.frames = 0
+        self.hint_counts = Counter()
+        return closed
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Lazily loaded MediaPipe graphs
+A ModelSpec names the outputs a caller stores (pose, hands, face,
+segmentation) and the model complexity; the registry builds the
+cheapest graph that produces them on first use: Pose when only body
+landmarks are needed, Holistic once hands or face are. Face refinement
+(iris landmarks) is never enabled since only the face landmark count
+is stored.
+"""
+
+import os
+import logging
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = ("pose", "hands", "face", "segmentation")
+
+ModelSpec = namedtuple("ModelSpec", ["components", "complexity"])
+
+# Processing level -> what motion extraction computes for it. Quick passes
+# leave videos in 'preview' status, which motion extraction never claims,
+# so only the standard level has a tier.
+DEFAULT_TIERS = {
+    "standard": ModelSpec(("pose", "hands", "face"), 2),
+}
+
+
+def tier_for(level):
+    """ModelSpec of a processing level, overridable per level with
+    MNEMO_MOTION_<LEVEL>_COMPONENTS and MNEMO_MOTION_<LEVEL>_COMPLEXITY"""
+    if level not in DEFAULT_TIERS:
+        level = "standard"
+    default = DEFAULT_TIERS[level]
+    prefix = f"MNEMO_MOTION_{level.upper()}_"
+
+    components = os.environ.get(prefix + "COMPONENTS")
+    if components:
+        components = tuple(c for c in COMPONENTS if c in components.split(","))
+    else:
+        components = default.components
+    if "pose" not in components:
+        components = ("pose",) + components
+
+    complexity = int(os.environ.get(prefix + "COMPLEXITY", default.complexity))
+    return ModelSpec(components, min(max(complexity, 0), 2))
+
+
+class ModelRegistry:
+    def __init__(self, max_loaded=None):
+        # Every graph holds its own model weights; keep one by default
+        self.max_loaded = max_loaded or int(os.environ.get("MNEMO_MOTION_MAX_MODELS", "1"))
+        self._graphs = OrderedDict()
+
+    def get(self, spec):
+        """The graph for spec, building it (and evicting the least recently used one) if needed"""
+        graph = self._graphs.get(spec)
+        if graph is not None:
+            self._graphs.move_to_end(spec)
+            return graph
+
+        while len(self._graphs) >= self.max_loaded:
+            old_spec, old_graph = self._graphs.popitem(last=False)
+            logger.info(f"Unloading {'+'.join(old_spec.components)} graph (complexity {old_spec.complexity})")
+            old_graph.close()
+
+        graph = self._build(spec)
+        self._graphs[spec] = graph
+        return graph
+
+    def _build(self, spec):
+        import mediapipe as mp
+
+        segmentation = "segmentation" in spec.components
+        logger.info(f"Loading {'+'.join(spec.components)} graph (complexity {spec.complexity})")
+
+        if "hands" in spec.components or "face" in spec.components:
+            return mp.solutions.holistic.Holistic(
+                static_image_mode=False,
+                model_complexity=spec.complexity,
+                enable_segmentation=segmentation,
+                refine_face_landmarks=False,
+                min_detection_confidence=0.5,
+                min_tracking_confidence=0.5
+            )
+        return mp.solutions.pose.Pose(
+            static_image_mode=False,
+            model_complexity=spec.complexity,
+            enable_segmentation=segmentation,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+
+    def close(self):
+        for graph in self._graphs.values():
+            graph.close()
+        self._graphs.clear()
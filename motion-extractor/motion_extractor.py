@@ -7,54 +7,71 @@ Processes frames to extract human pose data
 import os
 import sys
 import json
-import sqlite3
 import logging
 import time
+from collections import Counter
+from contextlib import nullcontext
 from pathlib import Path
-import numpy as np
 import cv2
-import mediapipe as mp
+
+# Shared modules are copied next to this script in the container image
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+
+from storage import Storage
+from frame_archive import open_frames
+from work_dir import WorkDir
+from metrics import Metrics
+from profiling import profile_settings, profiled
+from models import ModelRegistry, tier_for
+from gating import DUPLICATE, INFERRED, PoseGate, gate_settings
+from landmark_store import LandmarkStore
+from landmarks import ACTION_HINTS, POSE_LANDMARK_NAMES, LandmarkSequence, MotionSegmenter
+from pose import (PoseJob, PoseRunner, infer_timeline, plan_pose_chunks, pose_settings,
+                  roi_settings, run_pose_chunks)
+
+# Frames whose motion features are computed (and rows queued) together
+FEATURE_BLOCK = 256
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class MotionExtractor:
-    def __init__(self, db_path="/data/video_memory.db"):
+    def __init__(self, db_path="/data/video_memory.db", metrics_port=None):
         self.db_path = db_path
+        self.storage = Storage(db_path)
+        self.workspace = WorkDir(self.storage)
+        # Landmarks go to landmark_chunks; MNEMO_LANDMARK_JSON=1 also keeps them in gapper_reports
+        self.landmark_store = LandmarkStore(self.storage)
+        self.landmark_json = os.environ.get("MNEMO_LANDMARK_JSON", "0") == "1"
+        
+        if metrics_port is None:
+            metrics_port = int(os.environ.get("MNEMO_METRICS_PORT", "9103"))
+        self.metrics = Metrics("motion", metrics_port)
+        self.metrics.track_storage(self.storage)
+        self.profile_all, self.profile_dir = profile_settings(db_path)
+        # Failed videos are retried after other work, then given up on
+        self.max_attempts = int(os.environ.get("MNEMO_MOTION_MAX_ATTEMPTS", "3"))
+        self.frames_processed = 0
+        self.frame_width = int(os.environ.get("MNEMO_MOTION_FRAME_WIDTH", "640"))
+        
+        # MediaPipe graphs load on first use, sized by the tier of each video
+        self.models = ModelRegistry()
+        self.spec = tier_for("standard")
+        # Optional tracking crop around the subject of the previous frame
+        self.roi = roi_settings()
+        self.runner = PoseRunner(self.models, self.spec, self.metrics.time, self.roi)
+        # Parallel mode: MNEMO_MOTION_WORKERS processes, each with its own graph
+        (self.pose_workers, self.pose_warmup, self.pose_min_chunk, self.pose_max_chunk,
+         self.pose_retries) = pose_settings()
+        # Optional gate that skips inference on static or empty frames
+        self.gate = gate_settings()
+        self.gate_enabled = self.gate[0] != "off"
         
-        # Initialize MediaPipe
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=2,  # 0, 1, or 2. Higher = more accurate but slower
-            enable_segmentation=True,
-            min_detection_confidence=0.5
-        )
-        self.mp_drawing = mp.solutions.drawing_utils
-        
-        # MediaPipe Holistic for full body + hands + face
-        self.mp_holistic = mp.solutions.holistic
-        self.holistic = self.mp_holistic.Holistic(
-            static_image_mode=False,
-            model_complexity=2,
-            enable_segmentation=True,
-            refine_face_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        
-    def connect_db(self):
-        """Connect to SQLite database"""
-        return sqlite3.connect(self.db_path)
-    
     def get_next_task(self):
         """Get next motion extraction task"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        
         # Get videos that have been processed but not motion extracted
-        cursor.execute("""
+        result = self.storage.query_one("""
             SELECT DISTINCT vm.video_id 
             FROM video_metadata vm
             WHERE vm.status = 'completed'
@@ -63,286 +80,224 @@ class MotionExtractor:
                 WHERE gr.video_id = vm.video_id 
                 AND gr.gapper_type = 'motion'
             )
+            ORDER BY (
+                SELECT COUNT(*) FROM gapper_reports gr
+                WHERE gr.video_id = vm.video_id
+                AND gr.gapper_type = 'motion_error'
+            )
             LIMIT 1
         """)
         
-        result = cursor.fetchone()
-        conn.close()
-        
         return result[0] if result else None
     
-    def extract_pose_from_frame(self, frame):
-        """Extract pose landmarks from a single frame"""
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Process with MediaPipe
-        results = self.pose.process(rgb_frame)
-        
-        if results.pose_landmarks:
-            # Convert landmarks to dict
-            landmarks = {}
-            for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                landmarks[f"point_{idx}"] = {
-                    "x": landmark.x,
-                    "y": landmark.y,
-                    "z": landmark.z,
-                    "visibility": landmark.visibility
-                }
-            return landmarks
-        return None
+    def pending_videos(self):
+        """Number of completed videos still waiting for motion extraction"""
+        result = self.storage.query_one("""
+            SELECT COUNT(*) FROM video_metadata vm
+            WHERE vm.status = 'completed'
+            AND NOT EXISTS (
+                SELECT 1 FROM gapper_reports gr
+                WHERE gr.video_id = vm.video_id
+                AND gr.gapper_type = 'motion'
+            )
+        """)
+        return result[0]
+    
+    def processing_level(self, video_id):
+        """Level the video's frames were extracted at, which picks the model tier"""
+        row = self.storage.query_one(
+            "SELECT processing_level FROM video_metadata WHERE video_id = ?", (video_id,)
+        )
+        return row[0] if row and row[0] else "standard"
     
     def extract_holistic_from_frame(self, frame):
-        """Extract full body, hands, and face landmarks"""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.holistic.process(rgb_frame)
-        
-        holistic_data = {}
-        
-        # Pose landmarks (33 points)
-        if results.pose_landmarks:
-            holistic_data["pose"] = {}
-            for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                holistic_data["pose"][self.get_pose_landmark_name(idx)] = {
-                    "x": landmark.x,
-                    "y": landmark.y,
-                    "z": landmark.z,
-                    "visibility": landmark.visibility
-                }
-        
-        # Face landmarks (468 points)
-        if results.face_landmarks:
-            holistic_data["face"] = {
-                "landmark_count": len(results.face_landmarks.landmark),
-                "detected": True
-            }
-        
-        # Left hand (21 points)
-        if results.left_hand_landmarks:
-            holistic_data["left_hand"] = {}
-            for idx, landmark in enumerate(results.left_hand_landmarks.landmark):
-                holistic_data["left_hand"][f"point_{idx}"] = {
-                    "x": landmark.x,
-                    "y": landmark.y,
-                    "z": landmark.z
-                }
-        
-        # Right hand (21 points)
-        if results.right_hand_landmarks:
-            holistic_data["right_hand"] = {}
-            for idx, landmark in enumerate(results.right_hand_landmarks.landmark):
-                holistic_data["right_hand"][f"point_{idx}"] = {
-                    "x": landmark.x,
-                    "y": landmark.y,
-                    "z": landmark.z
-                }
-        
-        return holistic_data if holistic_data else None
+        """Extract body landmarks plus the hands, face and segmentation of the current tier"""
+        return self.runner.infer(frame)
     
     def get_pose_landmark_name(self, idx):
         """Get human-readable name for pose landmark"""
-        landmark_names = {
-            0: "nose", 1: "left_eye_inner", 2: "left_eye", 3: "left_eye_outer",
-            4: "right_eye_inner", 5: "right_eye", 6: "right_eye_outer",
-            7: "left_ear", 8: "right_ear", 9: "mouth_left", 10: "mouth_right",
-            11: "left_shoulder", 12: "right_shoulder", 13: "left_elbow",
-            14: "right_elbow", 15: "left_wrist", 16: "right_wrist",
-            17: "left_pinky", 18: "right_pinky", 19: "left_index",
-            20: "right_index", 21: "left_thumb", 22: "right_thumb",
-            23: "left_hip", 24: "right_hip", 25: "left_knee",
-            26: "right_knee", 27: "left_ankle", 28: "right_ankle",
-            29: "left_heel", 30: "right_heel", 31: "left_foot_index",
-            32: "right_foot_index"
-        }
-        return landmark_names.get(idx, f"point_{idx}")
+        return POSE_LANDMARK_NAMES[idx] if idx < len(POSE_LANDMARK_NAMES) else f"point_{idx}"
     
     def calculate_motion_features(self, current_pose, previous_pose):
         """Calculate motion features between two poses"""
-        if not current_pose or not previous_pose:
-            return {"motion_detected": False}
-        
-        features = {
-            "motion_detected": True,
-            "joint_velocities": {},
-            "total_movement": 0.0
-        }
-        
-        # Calculate movement for each joint
-        for joint_name in current_pose.get("pose", {}).keys():
-            if joint_name in previous_pose.get("pose", {}):
-                curr = current_pose["pose"][joint_name]
-                prev = previous_pose["pose"][joint_name]
-                
-                # Calculate Euclidean distance
-                movement = np.sqrt(
-                    (curr["x"] - prev["x"])**2 + 
-                    (curr["y"] - prev["y"])**2 + 
-                    (curr["z"] - prev["z"])**2
-                )
-                
-                features["joint_velocities"][joint_name] = movement
-                features["total_movement"] += movement
-        
-        # Detect specific actions
-        features["action_hints"] = self.detect_actions(current_pose, features["joint_velocities"])
-        
-        return features
-    
-    def detect_actions(self, pose, velocities):
-        """Detect common actions from pose and movement"""
-        actions = []
-        
-        if not pose or "pose" not in pose:
-            return actions
-        
-        pose_data = pose["pose"]
-        
-        # Check if arms are raised
-        if "left_wrist" in pose_data and "left_shoulder" in pose_data:
-            if pose_data["left_wrist"]["y"] < pose_data["left_shoulder"]["y"]:
-                actions.append("left_arm_raised")
-        
-        if "right_wrist" in pose_data and "right_shoulder" in pose_data:
-            if pose_data["right_wrist"]["y"] < pose_data["right_shoulder"]["y"]:
-                actions.append("right_arm_raised")
-        
-        # Check for jumping (high ankle movement)
-        if velocities.get("left_ankle", 0) > 0.1 or velocities.get("right_ankle", 0) > 0.1:
-            actions.append("possible_jump")
-        
-        # Check for walking/running (alternating knee movement)
-        if velocities.get("left_knee", 0) > 0.05 and velocities.get("right_knee", 0) > 0.05:
-            actions.append("walking_or_running")
-        
-        return actions
+        sequence = LandmarkSequence(2)
+        sequence.append(0, previous_pose)
+        sequence.append(1, current_pose)
+        return sequence.features_dict(sequence.motion_features(1), 1) or {"motion_detected": False}
     
     def process_video_frames(self, video_id):
         """Process all frames for a video"""
-        work_dir = Path("/tmp/mnemo_work") / video_id / "frames"
+        work_dir = self.workspace.video_dir(video_id) / "frames"
+        frames = open_frames(work_dir)
         
-        if not work_dir.exists():
+        if frames is None:
             logger.error(f"Frames directory not found: {work_dir}")
             return False
         
-        frame_files = sorted(work_dir.glob("*.jpg"))
-        logger.info(f"Processing {len(frame_files)} frames for motion extraction")
-        
-        previous_pose = None
-        motion_sequence = []
-        
-        for idx, frame_path in enumerate(frame_files):
-            # Load frame
-            frame = cv2.imread(str(frame_path))
-            if frame is None:
-                continue
-            
-            # Extract pose
-            pose_data = self.extract_holistic_from_frame(frame)
+        # Holistic resizes internally, so the smallest pyramid level that keeps
+        # hands and face legible is enough
+        level = frames.level_for(self.frame_width)
+        logger.info(f"Processing {len(frames)} frames for motion extraction at level {level} "
+                    f"({'+'.join(self.spec.components)}, complexity {self.spec.complexity})")
+        
+        timeline = list(frames.timeline())
+        self.landmark_store.delete(video_id)
+        # A fresh runner per video: ROI tracking must not start from the last video's subject
+        self.runner = PoseRunner(self.models, self.spec, self.metrics.time, self.roi)
+        roi_counts = self.runner.roi_counts
+        if self.pose_workers > 1 and len(timeline) >= 2 * self.pose_min_chunk:
+            roi_counts = Counter()
+            poses = self.infer_parallel(work_dir, level, timeline, roi_counts)
+        else:
+            gate = PoseGate(*self.gate) if self.gate_enabled else None
+            poses = infer_timeline(frames, level, timeline, self.extract_holistic_from_frame, self.metrics.time, gate)
+        
+        # Only the current block of frames is held; segments are written as they close
+        sequence = LandmarkSequence()
+        segmenter = MotionSegmenter()
+        block = []
+        decisions = Counter()
+        segments = 0
+        
+        # The timeline expands near-duplicate references back to every sampled frame
+        for idx, (frame_number, timestamp, duplicate_of, pose_data, decision) in enumerate(poses):
+            decisions[decision] += 1
+            if decision != DUPLICATE:
+                # Gated frames count too, so the inference they save shows in throughput
+                self.frames_processed += 1
+                self.metrics.count_frames()
             
-            # Calculate motion features if we have a previous frame
-            motion_features = None
-            if previous_pose is not None:
-                motion_features = self.calculate_motion_features(pose_data, previous_pose)
-            
-            # Extract frame number from filename
-            frame_number = int(frame_path.stem.split('_')[1])
-            
-            # Store motion data
-            self.store_motion_data(video_id, frame_number, pose_data, motion_features)
-            
-            # Keep sequence for evolution detection
-            motion_sequence.append({
-                "frame": frame_number,
-                "pose": pose_data,
-                "features": motion_features
-            })
-            
-            previous_pose = pose_data
+            sequence.append(frame_number, pose_data)
+            block.append((frame_number, timestamp, duplicate_of, pose_data,
+                          decision if decision not in (INFERRED, DUPLICATE) else None))
+            if len(block) == FEATURE_BLOCK:
+                segments += self.store_motion_block(video_id, sequence, segmenter, block)
+                block = []
             
             if (idx + 1) % 10 == 0:
                 logger.info(f"Processed {idx + 1} frames...")
         
-        # Analyze motion sequence for patterns
-        self.analyze_motion_sequence(video_id, motion_sequence)
+        segments += self.store_motion_block(video_id, sequence, segmenter, block)
+        logger.info(f"Detected {segments} motion segments")
+        
+        if self.gate_enabled:
+            self.store_gate_report(video_id, decisions)
+        if self.roi:
+            logger.info(f"ROI tracking: {roi_counts.get('crop', 0)} cropped, "
+                        f"{roi_counts.get('fallback', 0)} fell back to the full frame, "
+                        f"{roi_counts.get('full', 0)} full-frame passes")
         
         return True
     
-    def analyze_motion_sequence(self, video_id, sequence):
-        """Analyze the full motion sequence for patterns and variants"""
-        if len(sequence) < 5:
-            return
-        
-        # Detect motion segments (continuous movement)
-        motion_segments = []
-        current_segment = None
-        
-        for item in sequence:
-            if item["features"] and item["features"].get("total_movement", 0) > 0.02:
-                if current_segment is None:
-                    current_segment = {
-                        "start_frame": item["frame"],
-                        "frames": [item]
-                    }
-                else:
-                    current_segment["frames"].append(item)
-            else:
-                if current_segment and len(current_segment["frames"]) > 3:
-                    current_segment["end_frame"] = current_segment["frames"][-1]["frame"]
-                    motion_segments.append(current_segment)
-                current_segment = None
-        
-        # Store motion segments for evolution
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        
-        for segment in motion_segments:
-            summary = f"Motion segment: {len(segment['frames'])} frames of movement"
-            
-            # Detect predominant action
-            all_actions = []
-            for frame in segment["frames"]:
-                if frame["features"] and "action_hints" in frame["features"]:
-                    all_actions.extend(frame["features"]["action_hints"])
-            
-            if all_actions:
-                most_common = max(set(all_actions), key=all_actions.count)
-                summary = f"Motion: {most_common} ({len(segment['frames'])} frames)"
+    def infer_parallel(self, frames_dir, level, timeline, roi_counts):
+        """Pose entries of the whole timeline in order, inferred in chunks by a process pool"""
+        chunks = plan_pose_chunks(len(timeline), self.pose_workers, self.pose_min_chunk, self.pose_max_chunk)
+        jobs = [PoseJob(index, str(frames_dir), level, self.spec, start, end, self.pose_warmup,
+                        self.gate if self.gate_enabled else None, self.roi)
+                for index, (start, end) in enumerate(chunks)]
+        logger.info(f"Inferring poses in {len(jobs)} chunks with {self.pose_workers} processes "
+                    f"({self.pose_warmup} warm-up frames each)")
+        
+        for result in run_pose_chunks(jobs, self.pose_workers, self.pose_retries):
+            for stage, seconds in result.timings:
+                self.metrics.observe(stage, seconds)
+            roi_counts.update(result.roi_counts)
+            yield from result.entries
+    
+    def store_motion_block(self, video_id, sequence, segmenter, block):
+        """Compute the motion features of the last len(block) frames at once, queue their rows,
+        store their landmarks as one chunk and write the motion segments they close
+
+        Returns the number of segments written.
+        """
+        if not block:
+            return 0
+        
+        start = len(sequence) - len(block)
+        features = sequence.motion_features(start)
+        moving = sequence.moving(features)
+        segments = 0
+        for i, (frame_number, timestamp, duplicate_of, pose_data, gate) in enumerate(block, start):
+            self.store_motion_data(video_id, frame_number, pose_data, sequence.features_dict(features, i),
+                                   timestamp, duplicate_of, gate)
             
-            cursor.execute("""
-                INSERT INTO gapper_reports 
-                (video_id, gapper_type, timestamp, gapper_id, start_frame, 
-                 end_frame, summary, importance, features)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                video_id,
-                "motion_segment",
-                int(time.time() * 1000),
-                f"motion_seg_{segment['start_frame']}",
-                segment["start_frame"],
-                segment["end_frame"],
-                summary,
-                0.8,  # High importance for motion segments
-                json.dumps({"actions": list(set(all_actions))})
-            ))
+            segment = segmenter.update(frame_number, moving[i - start], features.hints[i - start])
+            if segment:
+                self.store_motion_segment(video_id, segment)
+                segments += 1
         
-        conn.commit()
-        conn.close()
+        with self.metrics.time("landmark_write"):
+            self.landmark_store.write(video_id, [entry[0] for entry in block], [entry[3] for entry in block])
         
-        logger.info(f"Detected {len(motion_segments)} motion segments")
+        # The next block only needs the last frame as its predecessor
+        sequence.keep_last(1)
+        return segments
     
-    def store_motion_data(self, video_id, frame_number, pose_data, motion_features):
-        """Store motion data in database"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
+    def store_motion_segment(self, video_id, segment):
+        """Queue a closed motion segment for evolution detection"""
+        summary = f"Motion segment: {segment.frames} frames of movement"
+        
+        # Detect predominant action
+        actions = [name for name in ACTION_HINTS if segment.hint_counts[name]]
+        if actions:
+            most_common = max(actions, key=lambda name: segment.hint_counts[name])
+            summary = f"Motion: {most_common} ({segment.frames} frames)"
         
+        self.storage.add_gapper_report(
+            video_id,
+            "motion_segment",
+            int(time.time() * 1000),
+            f"motion_seg_{segment.start_frame}",
+            segment.start_frame,
+            segment.end_frame,
+            summary,
+            0.8,  # High importance for motion segments
+            {"actions": actions}
+        )
+    
+    def store_gate_report(self, video_id, decisions):
+        """Record how many frames the gate let through, carried over or marked empty"""
+        for decision, count in decisions.items():
+            self.metrics.gate_decision(decision, count)
+        
+        examined = sum(count for decision, count in decisions.items() if decision != DUPLICATE)
+        mode, static_diff, max_carry = self.gate
+        self.storage.add_gapper_report(
+            video_id,
+            "motion_gate",
+            0,
+            "motion_gate_summary",
+            0,
+            0,
+            f"Pose gate ran inference on {decisions[INFERRED]} of {examined} frames",
+            0.0,
+            {"mode": mode, "static_diff": static_diff, "max_carry": max_carry, "decisions": dict(decisions)}
+        )
+        logger.info(f"Pose gate decisions: {dict(decisions)}")
+    
+    def store_motion_data(self, video_id, frame_number, pose_data, motion_features, timestamp=None,
+                          duplicate_of=None, gate=None):
+        """Queue motion data for the batched writer"""
         # Create motion gapper report
         gapper_id = f"motion_{frame_number}"
         
-        features = {
-            "has_pose": pose_data is not None,
-            "pose_data": pose_data,
-            "motion_features": motion_features
-        }
+        if self.landmark_json:
+            features = {
+                "has_pose": pose_data is not None,
+                "pose_data": pose_data,
+                "motion_features": motion_features
+            }
+        else:
+            # Landmarks and joint velocities are in landmark_chunks
+            features = {
+                "has_pose": pose_data is not None,
+                "motion_features": {key: value for key, value in motion_features.items()
+                                    if key != "joint_velocities"} if motion_features else motion_features
+            }
+        if duplicate_of is not None:
+            features["duplicate_of"] = duplicate_of
+        if gate is not None:
+            features["gate"] = gate
         
         # Calculate importance based on motion
         importance = 0.3  # Base importance
@@ -355,49 +310,61 @@ class MotionExtractor:
             if motion_features and motion_features.get("action_hints"):
                 summary = f"Action: {', '.join(motion_features['action_hints'])}"
         
-        cursor.execute("""
-            INSERT INTO gapper_reports 
-            (video_id, gapper_type, timestamp, gapper_id, start_frame, 
-             end_frame, summary, importance, features)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        self.storage.add_gapper_report(
             video_id,
             "motion",
-            int(frame_number * 33.33),  # Assuming ~30fps, convert to ms
+            # Archive timestamps follow the sampled frames; legacy frames assume ~30fps
+            int(timestamp * 1000) if timestamp is not None and timestamp == timestamp else int(frame_number * 33.33),
             gapper_id,
             frame_number,
             frame_number,
             summary,
             importance,
-            json.dumps(features)
-        ))
-        
-        conn.commit()
-        conn.close()
+            features
+        )
     
     def process_one(self):
         """Process one video for motion extraction"""
-        video_id = self.get_next_task()
+        with self.metrics.time("claim"):
+            self.metrics.set_queue_depth(self.pending_videos())
+            video_id = self.get_next_task()
         
         if not video_id:
             return False
         
         logger.info(f"Processing motion for video {video_id}")
         
+        profiling = nullcontext()
+        if self.profile_all or self.profile_requested(video_id):
+            profiling = profiled(self.metrics, self.storage, video_id, f"motion_{int(time.time())}",
+                                 self.profile_dir)
+        
+        with profiling:
+            return self.extract_motion(video_id)
+    
+    def profile_requested(self, video_id):
+        """True if any task of the video was queued with options.profile"""
+        row = self.storage.query_one(
+            "SELECT MAX(profile) FROM processing_queue WHERE video_id = ?", (video_id,)
+        )
+        return bool(row and row[0])
+    
+    def extract_motion(self, video_id):
+        """Extract motion for one claimed video"""
+        started = time.perf_counter()
+        self.frames_processed = 0
         try:
-            success = self.process_video_frames(video_id)
+            self.workspace.acquire(video_id, "motion")
+            self.spec = tier_for(self.processing_level(video_id))
             
+            with self.storage.stage(video_id, "motion", "motion_segment", "motion_gate"):
+                success = self.process_video_frames(video_id)
+            
+            outcome = "success" if success else "skipped"
             if success:
                 logger.info(f"Successfully extracted motion for video {video_id}")
                 # Mark this video as having motion processed
-                conn = self.connect_db()
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO gapper_reports 
-                    (video_id, gapper_type, timestamp, gapper_id, start_frame, 
-                     end_frame, summary, importance, features)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+                self.storage.add_gapper_report(
                     video_id,
                     "motion_complete",
                     int(time.time() * 1000),
@@ -407,20 +374,15 @@ class MotionExtractor:
                     "Motion extraction completed",
                     0.0,
                     "{}"
-                ))
-                conn.commit()
-                conn.close()
+                )
+            elif self.workspace.evicted(video_id):
+                # Evicted under disk pressure before this stage ran: not a reason to give up
+                self.request_reextraction(video_id)
+                outcome = "requeued"
             else:
                 # Skip this video by marking it
                 logger.warning(f"Skipping video {video_id} - frames not available")
-                conn = self.connect_db()
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO gapper_reports 
-                    (video_id, gapper_type, timestamp, gapper_id, start_frame, 
-                     end_frame, summary, importance, features)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+                self.storage.add_gapper_report(
                     video_id,
                     "motion",
                     0,
@@ -430,17 +392,84 @@ class MotionExtractor:
                     "Skipped - frames not available",
                     0.0,
                     "{}"
-                ))
-                conn.commit()
-                conn.close()
+                )
             
+            self.storage.flush()
+            # The frames are no longer needed by this stage
+            self.workspace.release(video_id, "motion")
+            self.metrics.task_finished(outcome, self.frames_processed, time.perf_counter() - started)
             return True
             
         except Exception as e:
+            self.metrics.task_finished("failure")
             logger.error(f"Failed to process video {video_id}: {e}")
             import traceback
             traceback.print_exc()
-            return True
+            if self.record_failure(video_id, e) < self.max_attempts:
+                # Keep the frames for the next attempt, but let them be evicted meanwhile
+                self.workspace.hold(video_id, "motion")
+            else:
+                self.workspace.release(video_id, "motion")
+            # Back off instead of picking the same video again at once
+            return False
+    
+    def request_reextraction(self, video_id):
+        """Queue a new download of a video whose frames were evicted
+        
+        The video leaves the completed state until the worker has extracted
+        its frames again, so it is not picked in the meantime.
+        """
+        with self.storage.transaction() as conn:
+            queued = conn.execute("""
+                SELECT 1 FROM processing_queue
+                WHERE video_id = ? AND task_type = 'download' AND status IN ('pending', 'processing')
+            """, (video_id,)).fetchone()
+            if not queued:
+                conn.execute("""
+                    INSERT INTO processing_queue (video_id, task_type, priority, status, processing_level)
+                    VALUES (?, 'download', 10, 'pending', 'standard')
+                """, (video_id,))
+            conn.execute("UPDATE video_metadata SET status = 'pending' WHERE video_id = ?", (video_id,))
+        logger.warning(f"Frames of video {video_id} were evicted before motion extraction, "
+                       f"queued it for extraction again")
+    
+    def record_failure(self, video_id, error):
+        """Record a failed attempt as a motion_error row; returns the attempt number
+        
+        After max_attempts a motion_failed marker stops the video from being
+        picked again. The stage rows were already discarded.
+        """
+        row = self.storage.query_one(
+            "SELECT COUNT(*) FROM gapper_reports WHERE video_id = ? AND gapper_type = 'motion_error'",
+            (video_id,)
+        )
+        attempt = row[0] + 1
+        self.storage.add_gapper_report(
+            video_id,
+            "motion_error",
+            int(time.time() * 1000),
+            f"motion_error_{attempt}",
+            0,
+            0,
+            f"Motion extraction failed: {error}"[:500],
+            0.0,
+            {"attempt": attempt}
+        )
+        if attempt >= self.max_attempts:
+            logger.error(f"Giving up on motion for video {video_id} after {attempt} attempts")
+            self.storage.add_gapper_report(
+                video_id,
+                "motion",
+                0,
+                "motion_failed",
+                0,
+                0,
+                f"Failed after {attempt} attempts",
+                0.0,
+                "{}"
+            )
+        self.storage.flush()
+        return attempt
     
     def run(self):
         """Run the motion extractor in a loop"""
@@ -455,11 +484,13 @@ class MotionExtractor:
                     
             except KeyboardInterrupt:
                 logger.info("Shutting down...")
+                self.models.close()
+                self.storage.close()
                 break
             except Exception as e:
                 logger.error(f"Unexpected error: {e}")
                 time.sleep(5)
 
 if __name__ == "__main__":
-    extractor = MotionExtractor()
+    extractor = MotionExtractor(db_path=os.environ.get("DATABASE_PATH", "/data/video_memory.db"))
     extractor.run()
\ No newline at end of file
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Pose inference over a video's frame timeline, sequential or sharded
+In parallel mode the timeline is cut into contiguous chunks of at most
+MNEMO_MOTION_CHUNK_FRAMES, each run by a separate process with its own
+graph, and results stream back in chunk order with a bounded number of
+chunks in flight. A chunk first runs `warmup`
+frames before its start, whose results are dropped, so MediaPipe's
+tracking has settled by the first frame that counts. A chunk that
+starts inside a run of duplicates starts back at their stored original,
+whose pose they carry. Chunks carry no
+database state; the parent merges them in order and computes motion
+features across chunk boundaries exactly as in sequential mode.
+
+With a PoseGate, frames the gate rejects skip inference and their entry
+is CARRIED (previous pose) or EMPTY instead of INFERRED.
+
+ROI tracking (MNEMO_POSE_ROI=1) runs the graph on a padded crop around
+the previous frame's body landmarks and maps the results back to
+full-frame normalized coordinates, so stored pose data keeps its shape.
+When the torso is not confidently found in the crop, the frame is
+inferred again on the full image.
+"""
+
+import os
+import time
+import logging
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+import cv2
+
+from frame_archive import open_frames
+from process_pool import ordered_process_map
+from models import ModelRegistry
+from gating import DUPLICATE, EMPTY, INFERRED, PoseGate
+from landmarks import POSE_LANDMARK_NAMES
+
+logger = logging.getLogger(__name__)
+
+# Per timeline entry; decision is INFERRED, CARRIED, EMPTY or DUPLICATE
+PoseEntry = namedtuple("PoseEntry", "frame_number timestamp duplicate_of pose decision")
+
+# Everything a chunk process needs; plain values so it pickles
+# (gate: gate_settings() or None, roi: roi_settings())
+PoseJob = namedtuple("PoseJob", "index frames_dir level spec start end warmup gate roi")
+
+PoseChunkResult = namedtuple("PoseChunkResult", "index entries timings roi_counts")
+
+# Shoulders and hips: a crop is trusted only if these are visible
+TORSO = ("left_shoulder", "right_shoulder", "left_hip", "right_hip")
+# Crops covering more of the frame than this save nothing
+MAX_ROI_AREA = 0.5
+MIN_ROI_PIXELS = 96
+
+
+def pose_settings():
+    """Pose processes, warm-up frames, minimum and maximum chunk length and retries from the environment"""
+    workers = int(os.environ.get("MNEMO_MOTION_WORKERS", "1"))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    warmup = max(0, int(os.environ.get("MNEMO_MOTION_WARMUP", "8")))
+    min_chunk = int(os.environ.get("MNEMO_MOTION_MIN_CHUNK", "60"))
+    # Bounds the pose dicts a chunk hands back at once
+    max_chunk = max(min_chunk, int(os.environ.get("MNEMO_MOTION_CHUNK_FRAMES", "512")))
+    retries = int(os.environ.get("MNEMO_MOTION_RETRIES", "1"))
+    return workers, warmup, min_chunk, max_chunk, retries
+
+
+def roi_settings():
+    """(padding, min torso visibility) for ROI tracking, or None when it is off"""
+    if os.environ.get("MNEMO_POSE_ROI", "0") != "1":
+        return None
+    padding = float(os.environ.get("MNEMO_ROI_PADDING", "0.3"))
+    min_visibility = float(os.environ.get("MNEMO_ROI_MIN_VISIBILITY", "0.5"))
+    return padding, min_visibility
+
+
+def landmarks_to_dict(results, components):
+    """MediaPipe results -> the pose_data dict stored per frame, or None"""
+    holistic_data = {}
+
+    # Pose landmarks (33 points)
+    if results.pose_landmarks:
+        holistic_data["pose"] = {}
+        for idx, landmark in enumerate(results.pose_landmarks.landmark):
+            name = POSE_LANDMARK_NAMES[idx] if idx < len(POSE_LANDMARK_NAMES) else f"point_{idx}"
+            holistic_data["pose"][name] = {
+                "x": landmark.x,
+                "y": landmark.y,
+                "z": landmark.z,
+                "visibility": landmark.visibility
+            }
+
+    # Face landmarks (468 points)
+    if "face" in components and results.face_landmarks:
+        holistic_data["face"] = {
+            "landmark_count": len(results.face_landmarks.landmark),
+            "detected": True
+        }
+
+    # Hands (21 points each)
+    for side in ("left_hand", "right_hand"):
+        hand = getattr(results, f"{side}_landmarks") if "hands" in components else None
+        if hand:
+            holistic_data[side] = {}
+            for idx, landmark in enumerate(hand.landmark):
+                holistic_data[side][f"point_{idx}"] = {
+                    "x": landmark.x,
+                    "y": landmark.y,
+                    "z": landmark.z
+                }
+
+    # Share of the frame covered by the person
+    if "segmentation" in components and results.segmentation_mask is not None:
+        holistic_data["segmentation"] = {
+            "coverage": float((results.segmentation_mask > 0.5).mean())
+        }
+
+    return holistic_data if holistic_data else None
+
+
+def _remap(pose_data, box, frame_width, frame_height):
+    """Map pose_data inferred on the crop box = (x0, y0, x1, y1) pixels to full-frame coordinates"""
+    x0, y0, x1, y1 = box
+    sx, sy = (x1 - x0) / frame_width, (y1 - y0) / frame_height
+    ox, oy = x0 / frame_width, y0 / frame_height
+
+    for part in ("pose", "left_hand", "right_hand"):
+        for landmark in pose_data.get(part, {}).values():
+            landmark["x"] = ox + landmark["x"] * sx
+            landmark["y"] = oy + landmark["y"] * sy
+            # z shares the scale of x
+            landmark["z"] = landmark["z"] * sx
+    if "segmentation" in pose_data:
+        pose_data["segmentation"]["coverage"] *= sx * sy
+    return pose_data
+
+
+class PoseRunner:
+    """Runs the graph of one tier on single frames; timer(stage) times each inference
+
+    With roi = (padding, min_visibility) it follows the subject between
+    frames and infers on the padded crop around them.
+    """
+
+    def __init__(self, models, spec, timer, roi=None):
+        self.models = models
+        self.spec = spec
+        self.timer = timer
+        self.roi = roi
+        self.box = None
+        self.roi_counts = Counter()
+
+    def _process(self, graph, image):
+        rgb_frame = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        with self.timer("pose"):
+            results = graph.process(rgb_frame)
+        return landmarks_to_dict(results, self.spec.components)
+
+    def _confident(self, pose_data):
+        body = (pose_data or {}).get("pose")
+        if not body:
+            return False
+        visibility = [body[name]["visibility"] for name in TORSO if name in body]
+        return bool(visibility) and sum(visibility) / len(visibility) >= self.roi[1]
+
+    def _next_box(self, pose_data, frame_width, frame_height):
+        """Padded pixel box around the visible body landmarks, or None to infer on the full frame"""
+        if not self._confident(pose_data):
+            return None
+        points = [(lm["x"], lm["y"]) for lm in pose_data["pose"].values() if lm["visibility"] >= self.roi[1]]
+        if len(points) < 4:
+            return None
+
+        xs, ys = zip(*points)
+        pad = self.roi[0] * max(max(xs) - min(xs), max(ys) - min(ys))
+        x0, x1 = max(0.0, min(xs) - pad), min(1.0, max(xs) + pad)
+        y0, y1 = max(0.0, min(ys) - pad), min(1.0, max(ys) + pad)
+        if (x1 - x0) * (y1 - y0) > MAX_ROI_AREA:
+            return None
+
+        box = (int(x0 * frame_width), int(y0 * frame_height),
+               int(round(x1 * frame_width)), int(round(y1 * frame_height)))
+        if min(box[2] - box[0], box[3] - box[1]) < MIN_ROI_PIXELS:
+            return None
+        return box
+
+    def infer(self, frame):
+        graph = self.models.get(self.spec)
+        if self.roi is None:
+            return self._process(graph, frame)
+
+        frame_height, frame_width = frame.shape[:2]
+        if self.box is not None:
+            x0, y0, x1, y1 = self.box
+            pose_data = self._process(graph, frame[y0:y1, x0:x1])
+            if self._confident(pose_data):
+                self.roi_counts["crop"] += 1
+                pose_data = _remap(pose_data, self.box, frame_width, frame_height)
+                self.box = self._next_box(pose_data, frame_width, frame_height)
+                return pose_data
+            # Lost the subject in the crop: look at the whole frame again
+            self.roi_counts["fallback"] += 1
+
+        self.roi_counts["full"] += 1
+        pose_data = self._process(graph, frame)
+        self.box = self._next_box(pose_data, frame_width, frame_height)
+        return pose_data
+
+
+def infer_timeline(frames, level, entries, infer, timer, gate=None):
+    """Yield a PoseEntry per timeline entry; duplicates carry the previous pose over"""
+    previous_pose = None
+    for frame_number, timestamp, stored_index, duplicate_of in entries:
+        if duplicate_of is not None:
+            # Same picture as the last stored frame: its pose carries over
+            yield PoseEntry(frame_number, timestamp, duplicate_of, previous_pose, DUPLICATE)
+            continue
+
+        with timer("decode"):
+            frame = frames.read(stored_index, level)
+        if frame is None:
+            continue
+
+        decision = INFERRED
+        if gate is not None:
+            with timer("gate"):
+                decision = gate.decide(frame, previous_pose)
+
+        if decision == INFERRED:
+            previous_pose = infer(frame)
+        elif decision == EMPTY:
+            previous_pose = None
+        yield PoseEntry(frame_number, timestamp, None, previous_pose, decision)
+
+
+class TimingLog:
+    """Collects (stage, seconds) in a child process for the parent to report"""
+
+    def __init__(self):
+        self.timings = []
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((stage, time.perf_counter() - start))
+
+
+def plan_pose_chunks(count, workers, min_chunk, max_chunk):
+    """Split [0, count) timeline positions into contiguous ranges, one per worker
+    unless that would make them longer than max_chunk"""
+    chunks = max(1, min(workers, count // max(min_chunk, 1)), -(-count // max_chunk))
+    bounds = [round(i * count / chunks) for i in range(chunks + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def chunk_first(timeline, start, warmup):
+    """Timeline position a chunk starting at start runs from: warmup frames earlier,
+    and no later than the stored frame a duplicate run at that point copies"""
+    first = max(0, start - warmup)
+    while first > 0 and timeline[first][3] is not None:
+        first -= 1
+    return first
+
+
+def infer_chunk(job):
+    """Run pose inference over one timeline range (runs in a child process)"""
+    frames = open_frames(job.frames_dir)
+    timeline = list(frames.timeline())
+    first = chunk_first(timeline, job.start, job.warmup)
+
+    log = TimingLog()
+    models = ModelRegistry(1)
+    runner = PoseRunner(models, job.spec, log.time, job.roi)
+    gate = PoseGate(*job.gate) if job.gate else None
+    try:
+        entries = list(infer_timeline(frames, job.level, timeline[first:job.end], runner.infer, log.time, gate))
+    finally:
+        models.close()
+
+    # Drop the warm-up entries; frame numbers are unique and sorted
+    first_counted = timeline[job.start][0]
+    entries = [entry for entry in entries if entry.frame_number >= first_counted]
+    return PoseChunkResult(job.index, entries, log.timings, dict(runner.roi_counts))
+
+
+def run_pose_chunks(jobs, workers, retries):
+    """Yield chunk results in order, retrying failed chunks on their own
+
+    At most two chunks per worker are running or waiting to be consumed.
+    A chunk that still fails after `retries` extra attempts fails the
+    whole video.
+    """
+    return ordered_process_map(infer_chunk, jobs, workers, retries, lambda job: f"Pose chunk {job.index}")
@@ -0,0 +1,72 @@
+"""Parallel pose chunks must reproduce the sequential timeline"""
+
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT.parent / "common")]
+
+from pose import chunk_first, infer_timeline, plan_pose_chunks  # noqa: E402
+
+
+class StoredFrames:
+    """Frame source whose "frame" is its stored index"""
+
+    def read(self, stored_index, level=None):
+        return stored_index
+
+
+def make_timeline(count, duplicate_runs):
+    """(frame_number, timestamp, stored_index, duplicate_of) rows; duplicate_runs maps start -> length"""
+    timeline = []
+    stored = -1
+    original = None
+    run_end = -1
+    for position in range(count):
+        frame_number = position * 30
+        if position < run_end:
+            timeline.append((frame_number, float(position), stored, original))
+            continue
+        stored += 1
+        original = frame_number
+        timeline.append((frame_number, float(position), stored, None))
+        if position + 1 in duplicate_runs:
+            run_end = position + 1 + duplicate_runs[position + 1]
+    return timeline
+
+
+def infer(frame):
+    return {"pose": {"nose": {"x": frame, "y": 0.0, "z": 0.0, "visibility": 1.0}}}
+
+
+def sequential(timeline):
+    return list(infer_timeline(StoredFrames(), None, timeline, infer, lambda stage: nullcontext()))
+
+
+def chunked(timeline, workers, warmup, min_chunk=10, max_chunk=512):
+    entries = []
+    for start, end in plan_pose_chunks(len(timeline), workers, min_chunk, max_chunk):
+        first = chunk_first(timeline, start, warmup)
+        chunk = infer_timeline(StoredFrames(), None, timeline[first:end], infer, lambda stage: nullcontext())
+        entries.extend(entry for entry in chunk if entry.frame_number >= timeline[start][0])
+    return entries
+
+
+def test_duplicate_runs_crossing_chunk_boundaries():
+    # Four chunks of 100: runs longer than the warm-up straddle positions 100, 200 and 300
+    timeline = make_timeline(400, {90: 20, 185: 40, 299: 5})
+    assert [start for start, _ in plan_pose_chunks(400, 4, 10, 512)] == [0, 100, 200, 300]
+
+    expected = sequential(timeline)
+    for warmup in (0, 1, 8):
+        assert chunked(timeline, 4, warmup) == expected
+
+
+def test_chunk_first_steps_back_to_the_stored_original():
+    timeline = make_timeline(50, {10: 15})
+    # Positions 10-24 duplicate position 9
+    assert chunk_first(timeline, 20, 8) == 9
+    assert chunk_first(timeline, 20, 0) == 9
+    assert chunk_first(timeline, 30, 2) == 28
+    assert chunk_first(timeline, 3, 8) == 0
@@ -13,6 +13,7 @@ import (
 type ProcessVideoRequest struct {
     VideoURL        string                 `json:"video_url"`
     ProcessingLevel string                 `json:"processing_level"`
+    VideoID         string                 `json:"video_id,omitempty"` // refine an existing (quick) video
     Options         map[string]interface{} `json:"options,omitempty"`
 }
 
@@ -71,26 +72,58 @@ func (h *Handler) ProcessVideo(w http.ResponseWriter, r *http.Request) {
         return
     }
 
-    // Generate video ID
-    videoID := fmt.Sprintf("video_%d", time.Now().UnixNano())
-    
-    // Insert into database
-    _, err := h.db.Exec(`
-        INSERT INTO video_metadata (video_id, filename, status, created_at)
-        VALUES (?, ?, 'pending', ?)
-    `, videoID, req.VideoURL, time.Now().Unix()*1000)
-    
-    if err != nil {
-        log.Printf("Failed to insert video metadata: %v", err)
-        http.Error(w, "Failed to create video record", http.StatusInternalServerError)
+    // quick: keyframe-only preview; standard: full extraction (also refines a preview)
+    if req.ProcessingLevel == "" {
+        req.ProcessingLevel = "standard"
+    }
+    if req.ProcessingLevel != "quick" && req.ProcessingLevel != "standard" {
+        http.Error(w, "processing_level must be quick or standard", http.StatusBadRequest)
         return
     }
 
+    // options.profile: the workers write a CPU and allocation profile of this video's tasks
+    profile := 0
+    if enabled, ok := req.Options["profile"].(bool); ok && enabled {
+        profile = 1
+    }
+
+    videoID := req.VideoID
+    var err error
+
+    if videoID != "" {
+        // Re-process an existing video, e.g. a standard pass over a quick preview
+        var exists int
+        err = h.db.QueryRow(`SELECT COUNT(*) FROM video_metadata WHERE video_id = ?`, videoID).Scan(&exists)
+        if err != nil {
+            http.Error(w, "Database error", http.StatusInternalServerError)
+            return
+        }
+        if exists == 0 {
+            http.Error(w, "Video not found", http.StatusNotFound)
+            return
+        }
+    } else {
+        // Generate video ID
+        videoID = fmt.Sprintf("video_%d", time.Now().UnixNano())
+
+        // Insert into database
+        _, err = h.db.Exec(`
+            INSERT INTO video_metadata (video_id, filename, status, created_at)
+            VALUES (?, ?, 'pending', ?)
+        `, videoID, req.VideoURL, time.Now().Unix()*1000)
+
+        if err != nil {
+            log.Printf("Failed to insert video metadata: %v", err)
+            http.Error(w, "Failed to create video record", http.StatusInternalServerError)
+            return
+        }
+    }
+
     // Add to processing queue
     _, err = h.db.Exec(`
-        INSERT INTO processing_queue (video_id, task_type, priority, status)
-        VALUES (?, 'download', 10, 'pending')
-    `, videoID)
+        INSERT INTO processing_queue (video_id, task_type, priority, status, processing_level, profile)
+        VALUES (?, 'download', 10, 'pending', ?, ?)
+    `, videoID, req.ProcessingLevel, profile)
     
     if err != nil {
         log.Printf("Failed to add to queue: %v", err)
@@ -7,6 +7,7 @@ import (
 	"log"
 	"os"
 	"path/filepath"
+	"strings"
 	"time"
 
 	_ "github.com/mattn/go-sqlite3"
@@ -321,7 +322,8 @@ func initializeSchema(db *sql.DB) error {
 		height INTEGER,
 		created_at INTEGER DEFAULT (strftime('%s', 'now') * 1000),
 		processed_at INTEGER,
-		status TEXT DEFAULT 'pending'
+		status TEXT DEFAULT 'pending',
+		processing_level TEXT DEFAULT 'standard'
 	);
 
 	-- Processing queue table
@@ -336,10 +338,28 @@ func initializeSchema(db *sql.DB) error {
 		started_at INTEGER,
 		completed_at INTEGER,
 		error_message TEXT,
+		processing_level TEXT DEFAULT 'standard',
+		profile INTEGER DEFAULT 0,
+		lease_expiries INTEGER DEFAULT 0,
 		FOREIGN KEY (video_id) REFERENCES video_metadata(video_id)
 	);
 	`
 
-	_, err := db.Exec(schema)
-	return err
+	if _, err := db.Exec(schema); err != nil {
+		return err
+	}
+
+	// Databases created before these columns existed lack them
+	for _, migration := range []struct{ table, column string }{
+		{"processing_queue", "processing_level TEXT DEFAULT 'standard'"},
+		{"processing_queue", "profile INTEGER DEFAULT 0"},
+		{"processing_queue", "lease_expiries INTEGER DEFAULT 0"},
+		{"video_metadata", "processing_level TEXT DEFAULT 'standard'"},
+	} {
+		_, err := db.Exec(`ALTER TABLE ` + migration.table + ` ADD COLUMN ` + migration.column)
+		if err != nil && !strings.Contains(err.Error(), "duplicate column") {
+			return err
+		}
+	}
+	return nil
 }
\ No newline at end of file
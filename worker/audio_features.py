@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Vectorized per-segment audio features over full_audio.wav
+The 16-bit PCM is memory-mapped and processed in blocks of whole
+segments holding at most BLOCK_SUBFRAMES subframes, so memory does not
+grow with the segment duration; every feature is computed with strided NumPy operations,
+never a per-sample or per-segment Python loop.
+"""
+
+import struct
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUBFRAME = 512            # ~32 ms at 16 kHz, the unit for spectra and voice activity
+BLOCK_SUBFRAMES = 4096    # subframes analysed per block (~130 s at 16 kHz), bounds memory
+SILENCE_DB = -60.0
+VAD_MARGIN_DB = 12.0
+
+
+def pcm_memmap(audio_path):
+    """(int16 memmap of mono samples, sample rate) for a PCM WAV file"""
+    with open(audio_path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"Not a WAV file: {audio_path}")
+
+        rate = channels = bits = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"No data chunk in {audio_path}")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = f.read(size)
+                _, channels, rate = struct.unpack("<HHI", fmt[:8])
+                bits = struct.unpack("<H", fmt[14:16])[0]
+            elif chunk_id == b"data":
+                offset = f.tell()
+                break
+            else:
+                f.seek(size + (size & 1), 1)
+
+    if bits != 16 or channels != 1:
+        raise ValueError(f"Expected 16-bit mono PCM, got {bits}-bit x{channels}")
+
+    count = min(size, _file_size(audio_path) - offset) // 2
+    if count == 0:
+        return np.zeros(0, dtype="<i2"), rate
+    return np.memmap(audio_path, dtype="<i2", mode="r", offset=offset, shape=(count,)), rate
+
+
+def _file_size(path):
+    with open(path, "rb") as f:
+        return f.seek(0, 2)
+
+
+def _block_features(block, seg_len, rate):
+    """Features for a (segments, seg_len) float32 block in [-1, 1]"""
+    segments = block.shape[0]
+
+    rms = np.sqrt(np.mean(block * block, axis=1))
+    zcr = np.mean(np.signbit(block[:, 1:]) != np.signbit(block[:, :-1]), axis=1)
+
+    # Subframes inside each segment for spectra and voice activity
+    n_sub = max(1, seg_len // SUBFRAME)
+    sub = block[:, :n_sub * SUBFRAME].reshape(segments, n_sub, SUBFRAME)
+    sub_energy_db = 10 * np.log10(np.mean(sub * sub, axis=2) + 1e-10)
+
+    spectrum = np.abs(np.fft.rfft(sub * np.hanning(SUBFRAME).astype(np.float32), axis=2))
+    freqs = np.fft.rfftfreq(SUBFRAME, 1.0 / rate)
+    power = spectrum.sum(axis=2)
+    centroid = (spectrum @ freqs) / np.maximum(power, 1e-10)
+
+    normalized = spectrum / np.maximum(power[..., None], 1e-10)
+    flux = np.sum(np.maximum(np.diff(normalized, axis=1), 0), axis=2)
+
+    return {
+        "rms": rms,
+        "zcr": zcr,
+        "spectral_centroid": np.average(centroid, axis=1, weights=power + 1e-10),
+        "spectral_flux": flux.mean(axis=1) if n_sub > 1 else np.zeros(segments),
+        "sub_energy_db": sub_energy_db,
+    }
+
+
+def analyze_segments(audio_path, segment_duration=1.0):
+    """Per-segment features and importance, aligned with extract_audio_segments
+
+    Returns a dict of equal-length arrays, one entry per segment.
+    """
+    samples, rate = pcm_memmap(audio_path)
+    seg_len = int(round(segment_duration * rate))
+    n_segments = -(-len(samples) // seg_len)
+    # Whole segments per block; a segment longer than the budget is still one block
+    block_segments = max(1, BLOCK_SUBFRAMES // max(1, seg_len // SUBFRAME))
+
+    parts = []
+    for start in range(0, n_segments, block_segments):
+        stop = min(start + block_segments, n_segments)
+        raw = samples[start * seg_len:stop * seg_len]
+
+        # Zero-pad the final partial segment to a full row
+        block = np.zeros((stop - start) * seg_len, dtype=np.float32)
+        block[:len(raw)] = raw
+        block = block.reshape(stop - start, seg_len) / 32768.0
+
+        parts.append(_block_features(block, seg_len, rate))
+
+    if not parts:
+        return {name: np.zeros(0) for name in
+                ("rms", "rms_db", "zcr", "spectral_centroid", "spectral_flux", "voice_activity", "importance")}
+
+    features = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    # Scale the padded tail back to its real length
+    tail = len(samples) - (n_segments - 1) * seg_len
+    if tail < seg_len:
+        features["rms"][-1] *= np.sqrt(seg_len / tail)
+        features["zcr"][-1] *= (seg_len - 1) / max(tail - 1, 1)
+
+    features["rms_db"] = 20 * np.log10(features["rms"] + 1e-10)
+
+    # Energy-based voice activity against a track-wide noise floor
+    sub_energy = features.pop("sub_energy_db")
+    noise_floor = np.percentile(sub_energy, 10)
+    threshold = max(noise_floor + VAD_MARGIN_DB, SILENCE_DB)
+    features["voice_activity"] = np.mean(sub_energy > threshold, axis=1)
+
+    loudness = np.clip((features["rms_db"] - SILENCE_DB) / -SILENCE_DB, 0, 1)
+    # Spectral change only counts above the silence floor; hiss is all flux
+    flux = np.where(features["rms_db"] > SILENCE_DB, features["spectral_flux"], 0)
+    flux_norm = flux / max(np.percentile(flux, 95), 1e-10)
+    features["importance"] = np.clip(
+        0.5 * features["voice_activity"] + 0.3 * loudness + 0.2 * np.clip(flux_norm, 0, 1), 0, 1
+    )
+
+    logger.info(f"Analyzed {n_segments} audio segments (noise floor {noise_floor:.1f} dB)")
+    return features
+
+
+def segment_features(features, i):
+    """JSON-ready feature dict of segment i"""
+    return {
+        "rms": round(float(features["rms"][i]), 6),
+        "rms_db": round(float(features["rms_db"][i]), 2),
+        "zcr": round(float(features["zcr"][i]), 4),
+        "spectral_centroid": round(float(features["spectral_centroid"][i]), 1),
+        "spectral_flux": round(float(features["spectral_flux"][i]), 4),
+        "voice_activity": round(float(features["voice_activity"][i]), 3),
+    }
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Chunked frame extraction for long videos on one multi-core machine
+The video is cut into time ranges aligned to the sampling interval; each
+range is decoded, sampled and encoded into its own archive by a separate
+process that seeks straight to the range start. Chunks carry no database
+state, so a failed chunk is simply run again. The parent then merges the
+chunk archives and their frame rows in chunk order, which makes the
+result independent of scheduling.
+"""
+
+import os
+import shutil
+import logging
+from pathlib import Path
+from collections import namedtuple
+import cv2
+
+from decoders import frame_interval_for, make_decoder
+from frame_archive import FrameArchive, FrameArchiveWriter
+from process_pool import ordered_process_map
+from sampling import AdaptiveSampler, DuplicateFilter
+
+logger = logging.getLogger(__name__)
+
+Chunk = namedtuple("Chunk", "index start_frame end_frame")
+
+# Everything a chunk process needs; plain values so it pickles
+ChunkJob = namedtuple("ChunkJob", "video_path chunk_dir chunk sample_rate decoder_backend "
+                                  "array_width pyramid adaptive dedup")
+
+ChunkResult = namedtuple("ChunkResult", "index rows sampling frames_read")
+
+
+def chunk_settings():
+    """Chunk length, process count and retries from the environment"""
+    seconds = float(os.environ.get("MNEMO_CHUNK_SECONDS", "300"))
+    # Every chunk process holds its own decoder and frame buffers; more only on request
+    workers = int(os.environ.get("MNEMO_CHUNK_WORKERS", "0")) or min(2, os.cpu_count() or 1)
+    retries = int(os.environ.get("MNEMO_CHUNK_RETRIES", "2"))
+    return seconds, workers, retries
+
+
+def plan_chunks(frame_count, fps, sample_rate, chunk_seconds):
+    """Split [0, frame_count) into ranges that start on a sampled frame"""
+    frame_interval = frame_interval_for(fps, sample_rate)
+    # Round the chunk length to whole sampling intervals
+    chunk_frames = max(1, round(chunk_seconds * fps / frame_interval)) * frame_interval
+
+    chunks = []
+    for index, start in enumerate(range(0, frame_count, chunk_frames)):
+        end = min(start + chunk_frames, frame_count)
+        # The last chunk is open-ended: CAP_PROP_FRAME_COUNT is only an estimate
+        chunks.append(Chunk(index, start, end if end < frame_count else None))
+    return chunks
+
+
+def extract_chunk(job):
+    """Decode, sample and encode one chunk into job.chunk_dir (runs in a child process)"""
+    chunk_dir = Path(job.chunk_dir)
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    decoder = make_decoder(job.video_path, job.decoder_backend)
+    decoder.seek(job.chunk.start_frame, job.chunk.end_frame)
+
+    sampler = AdaptiveSampler() if job.adaptive else None
+    dedup = DuplicateFilter() if job.dedup else None
+    rows = []
+    variance = 0.0
+
+    with decoder, FrameArchiveWriter(chunk_dir, job.array_width, job.pyramid) as writer:
+        if sampler:
+            frames = sampler.select(decoder.sampled_frames(sampler.max_rate))
+        else:
+            frames = decoder.sampled_frames(job.sample_rate)
+
+        for frame_number, timestamp, frame in frames:
+            change_score = sampler.change_scores.pop(frame_number, None) if sampler else None
+            duplicate_of = dedup.check(frame_number, frame) if dedup else None
+
+            if duplicate_of is not None:
+                writer.add_reference(frame_number, timestamp, duplicate_of)
+            else:
+                writer.add(frame_number, timestamp, *writer.encode(frame))
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+
+            rows.append((frame_number, timestamp, variance, change_score, duplicate_of))
+
+    return ChunkResult(job.chunk.index, rows, sampler.summary() if sampler else None,
+                       decoder.frames_read - job.chunk.start_frame)
+
+
+def run_chunks(jobs, workers, retries):
+    """Run every job in a process pool, retrying failed chunks on their own
+
+    Returns results ordered by chunk index. A chunk that still fails
+    after `retries` extra attempts fails the whole extraction.
+    """
+    jobs = sorted(jobs, key=lambda job: job.chunk.index)
+    return list(ordered_process_map(extract_chunk, jobs, workers, retries, lambda job: f"Chunk {job.chunk.index}"))
+
+
+def merge_chunks(results, chunk_dirs, writer):
+    """Append the chunk archives to writer in chunk order, without re-encoding"""
+    for result, chunk_dir in zip(results, chunk_dirs):
+        archive = FrameArchive(chunk_dir)
+        array = archive.array()
+        for i, (frame_number, timestamp) in enumerate(zip(archive.frame_numbers, archive.timestamps)):
+            jpegs = {level: (bytes(archive.jpeg(i, level)), archive.levels[level]["shape"])
+                     for level in archive.levels}
+            writer.add(int(frame_number), float(timestamp), jpegs, array[i] if array is not None else None)
+        for ref in archive.references():
+            writer.add_reference(int(ref["frame_number"]), float(ref["timestamp"]), int(ref["ref_frame"]))
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Frame decoder backends for the video worker
+Yields only the sampled frames of a video, numbered exactly as a full
+cap.read() loop with frame_count % frame_interval would number them
+"""
+
+import re
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def frame_interval_for(fps, sample_rate):
+    """Number of source frames between two sampled frames"""
+    return max(1, int(fps / sample_rate))
+
+
+class FrameDecoder:
+    """Base decoder: iterate (frame_number, timestamp, frame) for sampled frames"""
+
+    name = "base"
+
+    def __init__(self, video_path):
+        self.video_path = str(video_path)
+        self.frames_read = 0
+        self.start_frame = 0
+        self.end_frame = None
+
+        cap = cv2.VideoCapture(self.video_path)
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+    def sampled_frames(self, sample_rate=1.0):
+        raise NotImplementedError
+
+    def seek(self, start_frame, end_frame=None):
+        """Restrict decoding to source frames [start_frame, end_frame)
+
+        start_frame should be a multiple of the frame interval so the
+        sampled frame numbers match a decode of the whole video.
+        """
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.frames_read = start_frame
+
+    def _in_range(self):
+        return self.end_frame is None or self.frames_read < self.end_frame
+
+    def _open_capture(self):
+        cap = cv2.VideoCapture(self.video_path)
+        if self.start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        return cap
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class OpenCVReadDecoder(FrameDecoder):
+    """Reference backend: decodes and converts every frame (original behaviour)"""
+
+    name = "read"
+
+    def sampled_frames(self, sample_rate=1.0):
+        frame_interval = frame_interval_for(self.fps, sample_rate)
+        cap = self._open_capture()
+        try:
+            while self._in_range():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if self.frames_read % frame_interval == 0:
+                    yield self.frames_read, self.frames_read / self.fps, frame
+                self.frames_read += 1
+        finally:
+            cap.release()
+
+
+class OpenCVGrabDecoder(FrameDecoder):
+    """grab() every frame, retrieve() only the kept ones
+
+    grab() still advances the codec, but skips the colour conversion and
+    copy into a numpy array, which dominate per-frame cost for dropped frames.
+    """
+
+    name = "grab"
+
+    def sampled_frames(self, sample_rate=1.0):
+        frame_interval = frame_interval_for(self.fps, sample_rate)
+        cap = self._open_capture()
+        try:
+            while self._in_range() and cap.grab():
+                if self.frames_read % frame_interval == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    yield self.frames_read, self.frames_read / self.fps, frame
+                self.frames_read += 1
+        finally:
+            cap.release()
+
+
+class FFmpegPipeDecoder(FrameDecoder):
+    """ffmpeg rawvideo pipe with a select filter
+
+    ffmpeg decodes with its own thread pool and drops unselected frames
+    before scaling/pixel conversion, so only kept frames cross the pipe.
+    select=not(mod(n,N)) keeps the same frame numbers as the OpenCV loop.
+    """
+
+    name = "ffmpeg"
+
+    def __init__(self, video_path):
+        super().__init__(video_path)
+        self.process = None
+        self.frame_shape = self._probe_frame_shape()
+
+    def _probe_frame_shape(self):
+        """Read one frame so the shape reflects OpenCV/ffmpeg autorotation"""
+        cap = cv2.VideoCapture(self.video_path)
+        ret, frame = cap.read()
+        cap.release()
+        if not ret:
+            return (self.height, self.width, 3)
+        return frame.shape
+
+    def _command(self, frame_interval):
+        # Input seeking decodes from the previous keyframe and drops frames
+        # before the start, so frame n of the output is start_frame + n
+        seek = ["-ss", f"{self.start_frame / self.fps:.6f}"] if self.start_frame else []
+        limit = []
+        if self.end_frame is not None:
+            count = -(-(self.end_frame - self.start_frame) // frame_interval)
+            limit = ["-frames:v", str(max(count, 0))]
+        return [
+            "ffmpeg", "-v", "error", "-nostdin",
+            *seek,
+            "-i", self.video_path,
+            "-an",
+            "-vf", f"select=not(mod(n\\,{frame_interval}))",
+            "-vsync", "passthrough",
+            *limit,
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "pipe:1",
+        ]
+
+    def _spawn(self, command, frame_size):
+        return subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=frame_size,
+        )
+
+    def _finished(self, frames_yielded):
+        """Hook called once the pipe is exhausted"""
+
+    def sampled_frames(self, sample_rate=1.0):
+        frame_interval = frame_interval_for(self.fps, sample_rate)
+        height, width = self.frame_shape[:2]
+        frame_size = height * width * 3
+
+        self.process = self._spawn(self._command(frame_interval), frame_size)
+
+        try:
+            index = 0
+            while True:
+                buf = self.process.stdout.read(frame_size)
+                if len(buf) < frame_size:
+                    break
+                frame = np.frombuffer(buf, dtype=np.uint8).reshape((height, width, 3))
+                frame_number = self.start_frame + index * frame_interval
+                self.frames_read = frame_number + 1
+                yield frame_number, frame_number / self.fps, frame
+                index += 1
+            self._finished(index)
+        finally:
+            self.close()
+
+    def close(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.stdout.close()
+        self.process.wait()
+        self.process = None
+
+
+class KeyframeDecoder(FFmpegPipeDecoder):
+    """Decode only I-frames for the quick processing level
+
+    -skip_frame nokey makes the codec drop every non-key frame before it is
+    decoded, so a long video costs roughly one decode per GOP. Keyframes are
+    irregularly spaced: showinfo reports each one's pts on stderr, and the
+    frame number is derived from it. sample_rate caps how close two kept
+    keyframes may be.
+    """
+
+    name = "keyframes"
+
+    PTS_TIME = re.compile(r"Parsed_showinfo.*\bpts_time:\s*(\S+)")
+
+    def _command(self, frame_interval):
+        return [
+            "ffmpeg", "-hide_banner", "-nostats", "-nostdin",
+            "-skip_frame", "nokey",
+            "-i", self.video_path,
+            "-an",
+            "-vf", "showinfo",
+            "-vsync", "passthrough",
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "pipe:1",
+        ]
+
+    def _spawn(self, command, frame_size):
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=frame_size,
+        )
+        self.timestamps = queue.Queue()
+        # showinfo logs a frame before it reaches the encoder, so its pts is
+        # always queued before the frame's bytes can be read from stdout
+        self.stderr_reader = threading.Thread(target=self._read_timestamps, args=(process.stderr,),
+                                              daemon=True)
+        self.stderr_reader.start()
+        return process
+
+    def _read_timestamps(self, stderr):
+        for line in iter(stderr.readline, b""):
+            match = self.PTS_TIME.search(line.decode(errors="replace"))
+            if match:
+                try:
+                    self.timestamps.put(float(match.group(1)))
+                except ValueError:
+                    self.timestamps.put(None)
+        stderr.close()
+
+    def sampled_frames(self, sample_rate=1.0):
+        height, width = self.frame_shape[:2]
+        frame_size = height * width * 3
+        min_gap = 1.0 / sample_rate if sample_rate else 0.0
+
+        self.process = self._spawn(self._command(None), frame_size)
+
+        try:
+            last_timestamp = None
+            while True:
+                buf = self.process.stdout.read(frame_size)
+                if len(buf) < frame_size:
+                    break
+                timestamp = self.timestamps.get(timeout=30)
+                if timestamp is None:
+                    continue
+                self.frames_read += 1
+                if last_timestamp is not None and timestamp - last_timestamp < min_gap:
+                    continue
+                last_timestamp = timestamp
+                frame = np.frombuffer(buf, dtype=np.uint8).reshape((height, width, 3))
+                frame_number = int(round(timestamp * self.fps))
+                yield frame_number, frame_number / self.fps, frame
+        finally:
+            self.close()
+
+
+DECODERS = {
+    OpenCVReadDecoder.name: OpenCVReadDecoder,
+    OpenCVGrabDecoder.name: OpenCVGrabDecoder,
+    FFmpegPipeDecoder.name: FFmpegPipeDecoder,
+    KeyframeDecoder.name: KeyframeDecoder,
+}
+
+
+def make_decoder(video_path, backend=None):
+    """Create a decoder, defaulting to ffmpeg when available"""
+    if backend is None:
+        backend = "ffmpeg" if shutil.which("ffmpeg") else "grab"
+
+    if backend in ("ffmpeg", "keyframes") and not shutil.which("ffmpeg"):
+        logger.warning(f"ffmpeg not found, falling back to grab decoder instead of {backend}")
+        backend = "grab"
+
+    if backend not in DECODERS:
+        raise ValueError(f"Unknown decoder backend: {backend}")
+
+    return DECODERS[backend](video_path)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Bounded, order-preserving thread pipeline for per-frame work
+OpenCV releases the GIL in imwrite/cvtColor/Laplacian, so a small pool
+overlaps JPEG encoding and blur scoring with decoding on the caller thread
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def pipeline_settings():
+    """Pool size and queue depth from the environment (sized for the 600 MB container)"""
+    workers = int(os.environ.get("MNEMO_FRAME_WORKERS", "2"))
+    queue_depth = int(os.environ.get("MNEMO_FRAME_QUEUE_DEPTH", "8"))
+    return workers, max(1, queue_depth)
+
+
+def ordered_map(fn, items, workers=2, queue_depth=8):
+    """Yield fn(item) for each item, in input order
+
+    At most queue_depth items are in flight, so memory stays bounded by
+    queue_depth decoded frames. workers=0 runs fn inline.
+    """
+    if workers <= 0:
+        for item in items:
+            yield fn(item)
+        return
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame") as pool:
+        try:
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= queue_depth:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
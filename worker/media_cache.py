@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of downloaded media and extracted artifacts
+Entries are keyed by a hash of the media file; normalized URLs point at
+entries so a repeated URL never downloads again. Artifacts are
+hard-linked into the new video's work directory and its frame/audio
+gapper rows are copied from the video that produced the entry, as
+long as that video still has as many rows as the entry recorded.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+logger = logging.getLogger(__name__)
+
+CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS media_cache_entries (
+        content_hash TEXT PRIMARY KEY,
+        source_video_id TEXT NOT NULL,
+        metadata TEXT NOT NULL,
+        frame_count INTEGER NOT NULL,
+        audio_segments INTEGER NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        last_used INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS media_cache_urls (
+        url_key TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL
+    );
+"""
+
+CACHED_GAPPER_TYPES = ("frame", "audio")
+ARTIFACT_DIRS = ("frames", "audio")
+
+# Query parameters that never change which video a URL points at
+TRACKING_PARAMS = {"feature", "si", "pp", "t", "start", "ab_channel", "list", "index"}
+
+
+def normalize_url(url):
+    """Canonical form of a video URL, used as the URL cache key"""
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    for prefix in ("www.", "m.", "music."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+
+    path = parsed.path.rstrip("/")
+    query = [(k, v) for k, v in parse_qsl(parsed.query)
+             if k not in TRACKING_PARAMS and not k.startswith("utm_")]
+
+    # youtu.be/<id> and /shorts/<id> are the same video as /watch?v=<id>
+    if host == "youtu.be" and path:
+        host, query, path = "youtube.com", [("v", path.lstrip("/"))] + query, "/watch"
+    elif host == "youtube.com" and path.startswith("/shorts/"):
+        query, path = [("v", path.split("/")[2])] + query, "/watch"
+
+    if host == "youtube.com" and path == "/watch":
+        query = [(k, v) for k, v in query if k == "v"]
+
+    return urlunparse(("https", host, path, "", urlencode(sorted(query)), ""))
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """sha256 of the media file contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_tree(src, dst):
+    """Hard-link every file under src into dst, copying across filesystems"""
+    size = 0
+    for root, _, files in os.walk(src):
+        target_dir = Path(dst) / Path(root).relative_to(src)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            source = Path(root) / name
+            target = target_dir / name
+            if target.exists():
+                target.unlink()
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+            size += source.stat().st_size
+    return size
+
+
+class MediaCache:
+    def __init__(self, storage, cache_dir, max_bytes=None):
+        self.storage = storage
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.environ.get("MNEMO_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+        self.storage.connection().executescript(CACHE_SCHEMA)
+
+    def entry_dir(self, content_hash):
+        return self.cache_dir / content_hash
+
+    def lookup_url(self, video_url):
+        """Cached entry for a URL, or None"""
+        row = self.storage.query_one(
+            "SELECT content_hash FROM media_cache_urls WHERE url_key = ?",
+            (normalize_url(video_url),)
+        )
+        return self.lookup_content(row[0]) if row else None
+
+    def lookup_content(self, content_hash):
+        """Cached entry for a content hash, or None"""
+        row = self.storage.query_one("""
+            SELECT content_hash, source_video_id, metadata, frame_count, audio_segments
+            FROM media_cache_entries WHERE content_hash = ?
+        """, (content_hash,))
+
+        if not row:
+            return None
+
+        if not self.entry_dir(content_hash).exists():
+            # Index row from another container or a wiped /tmp
+            self.forget(content_hash)
+            return None
+
+        return {
+            "content_hash": row[0],
+            "source_video_id": row[1],
+            "metadata": json.loads(row[2]),
+            "frame_count": row[3],
+            "audio_segments": row[4],
+        }
+
+    def remember_url(self, video_url, content_hash):
+        self.storage.execute(
+            "INSERT OR REPLACE INTO media_cache_urls (url_key, content_hash) VALUES (?, ?)",
+            (normalize_url(video_url), content_hash)
+        )
+
+    def materialize(self, entry, video_id, video_dir):
+        """Copy the gapper rows to video_id and link cached artifacts into video_dir
+
+        Rows are copied from the video that produced the entry. If that video
+        has since been reprocessed its counts no longer match the entry, so
+        the entry is dropped and False returned for a full extraction.
+        """
+        expected = {"frame": entry["frame_count"], "audio": entry["audio_segments"]}
+        placeholders = ", ".join("?" for _ in CACHED_GAPPER_TYPES)
+        with self.storage.transaction() as conn:
+            counts = dict(conn.execute(f"""
+                SELECT gapper_type, COUNT(*) FROM gapper_reports
+                WHERE video_id = ? AND gapper_type IN ({placeholders})
+                GROUP BY gapper_type
+            """, (entry["source_video_id"], *CACHED_GAPPER_TYPES)).fetchall())
+            stale = any(counts.get(gapper_type, 0) != count for gapper_type, count in expected.items())
+            if not stale:
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO gapper_reports
+                    (video_id, gapper_type, timestamp, gapper_id, start_frame,
+                     end_frame, summary, importance, features)
+                    SELECT ?, gapper_type, timestamp, gapper_id, start_frame,
+                           end_frame, summary, importance, features
+                    FROM gapper_reports
+                    WHERE video_id = ? AND gapper_type IN ({placeholders})
+                """, (video_id, entry["source_video_id"], *CACHED_GAPPER_TYPES))
+                conn.execute(
+                    "UPDATE media_cache_entries SET last_used = ? WHERE content_hash = ?",
+                    (int(time.time() * 1000), entry["content_hash"])
+                )
+
+        if stale:
+            logger.warning(f"Cache entry {entry['content_hash'][:12]} expects {expected} rows but "
+                           f"{entry['source_video_id']} has {counts}, dropping it")
+            self.forget(entry["content_hash"])
+            return False
+
+        entry_dir = self.entry_dir(entry["content_hash"])
+        for name in ARTIFACT_DIRS:
+            if (entry_dir / name).exists():
+                link_tree(entry_dir / name, Path(video_dir) / name)
+
+        logger.info(f"Reused cached artifacts of {entry['source_video_id']} for {video_id}")
+        return True
+
+    def store(self, video_url, content_hash, video_id, video_dir, metadata, frame_count, audio_segments):
+        """Add a processed video to the cache, then evict down to the size limit"""
+        entry_dir = self.entry_dir(content_hash)
+        size = 0
+        for name in ARTIFACT_DIRS:
+            if (Path(video_dir) / name).exists():
+                size += link_tree(Path(video_dir) / name, entry_dir / name)
+
+        self.storage.execute("""
+            INSERT OR REPLACE INTO media_cache_entries
+            (content_hash, source_video_id, metadata, frame_count, audio_segments, size_bytes, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (content_hash, video_id, json.dumps(metadata), frame_count, audio_segments,
+              size, int(time.time() * 1000)))
+        self.remember_url(video_url, content_hash)
+
+        self.evict()
+
+    def forget(self, content_hash):
+        with self.storage.transaction() as conn:
+            conn.execute("DELETE FROM media_cache_entries WHERE content_hash = ?", (content_hash,))
+            conn.execute("DELETE FROM media_cache_urls WHERE content_hash = ?", (content_hash,))
+        shutil.rmtree(self.entry_dir(content_hash), ignore_errors=True)
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        rows = self.storage.query_all(
+            "SELECT content_hash, size_bytes FROM media_cache_entries ORDER BY last_used DESC"
+        )
+        total = 0
+        for content_hash, size in rows:
+            total += size
+            if total > self.max_bytes:
+                logger.info(f"Evicting cache entry {content_hash[:12]} ({size} bytes)")
+                self.forget(content_hash)
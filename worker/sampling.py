@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Adaptive ("saccadic") frame sampling and near-duplicate suppression
+
+Adaptive sampling: candidates are decoded at max_rate; a candidate is
+kept when its downscaled grayscale image has drifted far enough from
+the last kept frame, or when 1/min_rate seconds have passed without a
+kept frame. Static shots fall to min_rate, cuts and motion rise to
+max_rate.
+
+Duplicate suppression: a 64-bit dHash of each sampled frame is compared
+with the last stored frame; within the Hamming threshold the frame is
+recorded as a reference to that frame instead of being stored again.
+"""
+
+import os
+import cv2
+import numpy as np
+
+SIGNAL_WIDTH = 64
+
+
+def change_signal(frame):
+    """Tiny blurred grayscale thumbnail used for frame differencing"""
+    height, width = frame.shape[:2]
+    small = cv2.resize(frame, (SIGNAL_WIDTH, max(1, round(height * SIGNAL_WIDTH / width))),
+                       interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return cv2.GaussianBlur(small, (3, 3), 0).astype(np.int16)
+
+
+class AdaptiveSampler:
+    def __init__(self, min_rate=None, max_rate=None, threshold=None):
+        self.min_rate = min_rate or float(os.environ.get("MNEMO_SAMPLE_MIN_RATE", "0.2"))
+        self.max_rate = max_rate or float(os.environ.get("MNEMO_SAMPLE_MAX_RATE", "4.0"))
+        # Mean absolute gray-level difference (0-255) that counts as new content
+        self.threshold = threshold or float(os.environ.get("MNEMO_SAMPLE_THRESHOLD", "6.0"))
+
+        self.candidates = 0
+        self.kept = []
+        self.change_scores = {}
+
+    def select(self, candidates):
+        """Filter (frame_number, timestamp, frame) candidates down to the kept frames"""
+        last_signal = None
+        last_kept_at = None
+        max_gap = 1.0 / self.min_rate
+
+        for frame_number, timestamp, frame in candidates:
+            self.candidates += 1
+            signal = change_signal(frame)
+
+            if last_signal is None or signal.shape != last_signal.shape:
+                score = float("inf")
+            else:
+                score = float(np.mean(np.abs(signal - last_signal)))
+
+            if score >= self.threshold or timestamp - last_kept_at >= max_gap:
+                last_signal = signal
+                last_kept_at = timestamp
+                self.kept.append(timestamp)
+                self.change_scores[frame_number] = score if np.isfinite(score) else None
+                yield frame_number, timestamp, frame
+
+    def summary(self):
+        """Budget actually used, for the sampling gapper report"""
+        return {
+            "mode": "adaptive",
+            "min_rate": self.min_rate,
+            "max_rate": self.max_rate,
+            "threshold": self.threshold,
+            "candidates": self.candidates,
+            "kept": len(self.kept),
+            "timestamps": [round(t, 3) for t in self.kept],
+        }
+
+
+def dhash(frame):
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 thumbnail"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class DuplicateFilter:
+    def __init__(self, threshold=None):
+        self.threshold = threshold if threshold is not None else int(os.environ.get("MNEMO_DEDUP_THRESHOLD", "4"))
+        self.last_hash = None
+        self.last_frame_number = None
+        self.duplicates = 0
+
+    def check(self, frame_number, frame):
+        """Frame number this frame duplicates, or None if it should be stored"""
+        frame_hash = dhash(frame)
+        if self.last_hash is not None and bin(frame_hash ^ self.last_hash).count("1") <= self.threshold:
+            self.duplicates += 1
+            return self.last_frame_number
+
+        self.last_hash = frame_hash
+        self.last_frame_number = frame_number
+        return None
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Streaming ingest for the video worker
+yt-dlp writes the video to a pipe; a tee thread copies it to the work
+file and into one ffmpeg process that emits sampled frames and the
+16 kHz mono WAV while the download is still in progress.
+The frame rate is read with OpenCV from the first PROBE_SIZE bytes of
+the work file, as for a downloaded file; yt-dlp's fps is rounded and
+would make frame timestamps drift.
+"""
+
+import json
+import logging
+import subprocess
+import threading
+from pathlib import Path
+import cv2
+
+from decoders import FFmpegPipeDecoder
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20
+PROBE_SIZE = 4 << 20
+
+
+class StreamingUnsupported(Exception):
+    """The source cannot be decoded from a pipe; use download-then-process"""
+
+
+class StreamingDecoder(FFmpegPipeDecoder):
+    """Frame decoder fed by a running yt-dlp download"""
+
+    name = "stream"
+
+    def __init__(self, video_url, video_path, audio_path, yt_dlp_args=()):
+        # Frame size comes from yt-dlp, the frame rate from the stream itself
+        self.video_url = video_url
+        self.video_path = str(video_path)
+        self.audio_path = Path(audio_path)
+        self.yt_dlp_args = list(yt_dlp_args)
+        self.frames_read = 0
+        self.start_frame = 0
+        self.end_frame = None
+        self.process = None
+        self.download = None
+        self.tee_thread = None
+        self.download_stderr = ""
+        self.head = b""
+        self.out = None
+
+        self.info = self._probe()
+        # Known once the download has started, see _open_stream
+        self.fps = 0.0
+        self.width = int(self.info.get("width") or 0)
+        self.height = int(self.info.get("height") or 0)
+        self.has_audio = self.info.get("acodec") not in (None, "none")
+
+        if not (self.width and self.height):
+            raise StreamingUnsupported("yt-dlp did not report the frame size")
+
+        self.frame_shape = (self.height, self.width, 3)
+
+    def _probe(self):
+        """Ask yt-dlp for the selected format without downloading it"""
+        cmd = ["yt-dlp", "-j", *self.yt_dlp_args, self.video_url]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            raise StreamingUnsupported(f"yt-dlp probe failed: {e.stderr.strip()}")
+        return json.loads(result.stdout)
+
+    def _open_stream(self):
+        """Start yt-dlp, write the head of the stream to the work file and read its frame rate"""
+        self.download = subprocess.Popen(
+            ["yt-dlp", "-o", "-", "--no-progress", *self.yt_dlp_args, self.video_url],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self.stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self.stderr_thread.start()
+
+        chunks = []
+        size = 0
+        while size < PROBE_SIZE:
+            chunk = self.download.stdout.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        self.head = b"".join(chunks)
+
+        self.out = open(self.video_path, "wb")
+        self.out.write(self.head)
+        self.out.flush()
+
+        cap = cv2.VideoCapture(self.video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0.0
+        cap.release()
+        return fps
+
+    def sampled_frames(self, sample_rate=1.0):
+        fps = self._open_stream()
+        if fps <= 0:
+            # Finish the download for the fallback path without a decoder
+            self._start_tee(None)
+            raise StreamingUnsupported("could not read the frame rate from the start of the stream")
+        self.fps = fps
+        yield from super().sampled_frames(sample_rate)
+
+    def _command(self, frame_interval):
+        cmd = [
+            "ffmpeg", "-v", "error", "-nostdin",
+            "-i", "pipe:0",
+            "-map", "0:v:0",
+            # Pin the output size so the pipe frame size matches the probe
+            "-vf", f"select=not(mod(n\\,{frame_interval})),scale={self.width}:{self.height}",
+            "-vsync", "passthrough",
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "pipe:1",
+        ]
+        if self.has_audio:
+            self.audio_path.parent.mkdir(parents=True, exist_ok=True)
+            cmd += [
+                "-map", "0:a:0",
+                "-acodec", "pcm_s16le",
+                "-ar", "16000",
+                "-ac", "1",
+                "-y", str(self.audio_path),
+            ]
+        return cmd
+
+    def _spawn(self, command, frame_size):
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=frame_size,
+        )
+        self._start_tee(process.stdin)
+        return process
+
+    def _start_tee(self, decoder_stdin):
+        self.tee_thread = threading.Thread(target=self._tee, args=(decoder_stdin,), daemon=True)
+        self.tee_thread.start()
+
+    def _drain_stderr(self):
+        """Keep yt-dlp from blocking on a full stderr pipe"""
+        self.download_stderr = self.download.stderr.read().decode(errors="replace")
+
+    def _tee(self, decoder_stdin):
+        """Copy the download into the work file and the decoder (None: file only)
+
+        The head read by _open_stream is already in the work file.
+        """
+        feeding = decoder_stdin is not None
+        chunk = self.head
+        with self.out as out:
+            while True:
+                if feeding:
+                    try:
+                        decoder_stdin.write(chunk)
+                    except (BrokenPipeError, ValueError):
+                        # Decoder gave up; keep the download going for the fallback path
+                        feeding = False
+                chunk = self.download.stdout.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+        if decoder_stdin is not None:
+            try:
+                decoder_stdin.close()
+            except (BrokenPipeError, ValueError):
+                pass
+        self.stderr_thread.join()
+        self.download.wait()
+
+    def _finished(self, frames_yielded):
+        returncode = self.process.wait()
+        if returncode != 0 or frames_yielded == 0:
+            raise StreamingUnsupported(
+                f"ffmpeg could not decode the stream (exit {returncode}, {frames_yielded} frames)"
+            )
+
+    def wait_for_download(self):
+        """Block until the work file is complete; raise if yt-dlp failed"""
+        if self.tee_thread is not None:
+            self.tee_thread.join()
+        if self.download is not None and self.download.returncode != 0:
+            raise subprocess.CalledProcessError(
+                self.download.returncode, "yt-dlp", stderr=self.download_stderr
+            )
+        return Path(self.video_path)
+
+    def close(self):
+        super().close()
+        # Never abandon a half-written work file: the fallback path reads it
+        if self.tee_thread is not None:
+            self.tee_thread.join()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Lease-based claims on processing_queue
+A worker owns a task while assigned_to is its id and started_at (the
+lease timestamp) is fresher than the lease duration; heartbeats renew
+started_at and expired leases go back to 'pending', until a task has
+expired MNEMO_MAX_LEASE_EXPIRIES times and is failed instead
+"""
+
+import os
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id():
+    """WORKER_ID (or hostname) plus pid, unique per worker process"""
+    prefix = os.environ.get("WORKER_ID") or socket.gethostname()
+    return f"{prefix}-{os.getpid()}"
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class LeaseLost(Exception):
+    """Another worker took over the task while it was being processed"""
+
+
+PROCESSING_LEVELS = ("quick", "standard")
+DEFAULT_LEVEL = "standard"
+
+
+class TaskQueue:
+    def __init__(self, storage, worker_id=None, lease_seconds=None):
+        self.storage = storage
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds or float(os.environ.get("MNEMO_LEASE_SECONDS", "120"))
+        self.max_expiries = int(os.environ.get("MNEMO_MAX_LEASE_EXPIRIES", "3"))
+        self.ensure_schema()
+
+    def ensure_schema(self):
+        """Add processing_level, profile and lease_expiries to databases created before they existed"""
+        columns = {row[1] for row in self.storage.query_all("PRAGMA table_info(processing_queue)")}
+        if columns and "processing_level" not in columns:
+            self.storage.execute(
+                f"ALTER TABLE processing_queue ADD COLUMN processing_level TEXT DEFAULT '{DEFAULT_LEVEL}'"
+            )
+        if columns and "profile" not in columns:
+            self.storage.execute("ALTER TABLE processing_queue ADD COLUMN profile INTEGER DEFAULT 0")
+        if columns and "lease_expiries" not in columns:
+            self.storage.execute("ALTER TABLE processing_queue ADD COLUMN lease_expiries INTEGER DEFAULT 0")
+        
+        columns = {row[1] for row in self.storage.query_all("PRAGMA table_info(video_metadata)")}
+        if columns and "processing_level" not in columns:
+            self.storage.execute(
+                f"ALTER TABLE video_metadata ADD COLUMN processing_level TEXT DEFAULT '{DEFAULT_LEVEL}'"
+            )
+
+    def requeue_expired(self, task_type):
+        """Put task_type tasks whose lease ran out back in the queue
+
+        A task whose lease has already expired max_expiries times (its
+        workers keep dying on it) is failed instead.
+        """
+        cutoff = now_ms() - int(self.lease_seconds * 1000)
+        with self.storage.transaction() as conn:
+            failed = conn.execute("""
+                UPDATE processing_queue
+                SET status = 'failed', assigned_to = NULL, completed_at = ?,
+                    lease_expiries = lease_expiries + 1,
+                    error_message = 'Lease expired ' || (lease_expiries + 1) || ' times'
+                WHERE task_type = ? AND status = 'processing' AND started_at < ?
+                AND lease_expiries + 1 >= ?
+            """, (now_ms(), task_type, cutoff, self.max_expiries)).rowcount
+            expired = conn.execute("""
+                UPDATE processing_queue
+                SET status = 'pending', assigned_to = NULL, lease_expiries = lease_expiries + 1
+                WHERE task_type = ? AND status = 'processing' AND started_at < ?
+            """, (task_type, cutoff)).rowcount
+
+        if failed:
+            logger.warning(f"Failed {failed} {task_type} task(s) after {self.max_expiries} expired leases")
+        if expired:
+            logger.warning(f"Requeued {expired} {task_type} task(s) with expired leases")
+        return expired
+
+    def claim(self, task_type):
+        """Atomically claim the next pending task: (task_id, video_id, video_url, processing_level)"""
+        self.requeue_expired(task_type)
+
+        # BEGIN IMMEDIATE takes the write lock, so no other worker can
+        # select the same row between our SELECT and UPDATE
+        with self.storage.transaction() as conn:
+            task = conn.execute("""
+                SELECT id, video_id, processing_level FROM processing_queue
+                WHERE task_type = ? AND status = 'pending'
+                ORDER BY priority DESC, created_at ASC
+                LIMIT 1
+            """, (task_type,)).fetchone()
+
+            if not task:
+                return None, None, None, None
+
+            task_id, video_id, level = task
+            conn.execute("""
+                UPDATE processing_queue
+                SET status = 'processing', assigned_to = ?, started_at = ?
+                WHERE id = ?
+            """, (self.worker_id, now_ms(), task_id))
+
+            row = conn.execute(
+                "SELECT filename FROM video_metadata WHERE video_id = ?", (video_id,)
+            ).fetchone()
+
+        level = level or DEFAULT_LEVEL
+        if level not in PROCESSING_LEVELS:
+            logger.warning(f"Unknown processing level {level!r} for task {task_id}, using {DEFAULT_LEVEL}")
+            level = DEFAULT_LEVEL
+
+        return task_id, video_id, row[0] if row else None, level
+
+    def pending(self, task_type):
+        """Number of tasks of task_type waiting to be claimed"""
+        row = self.storage.query_one(
+            "SELECT COUNT(*) FROM processing_queue WHERE task_type = ? AND status = 'pending'",
+            (task_type,)
+        )
+        return row[0]
+
+    def profile_requested(self, task_id):
+        """True if the task was queued with options.profile"""
+        row = self.storage.query_one("SELECT profile FROM processing_queue WHERE id = ?", (task_id,))
+        return bool(row and row[0])
+
+    def holds_lease(self, conn, task_id):
+        """True if we still own the task, read on conn (inside the caller's transaction)"""
+        row = conn.execute("""
+            SELECT 1 FROM processing_queue
+            WHERE id = ? AND assigned_to = ? AND status = 'processing'
+        """, (task_id, self.worker_id)).fetchone()
+        return row is not None
+
+    def renew(self, task_id):
+        """Extend our lease; False if another worker has taken the task over"""
+        renewed = self.storage.execute("""
+            UPDATE processing_queue
+            SET started_at = ?
+            WHERE id = ? AND assigned_to = ? AND status = 'processing'
+        """, (now_ms(), task_id, self.worker_id))
+        return renewed == 1
+
+    def complete(self, task_id):
+        """Mark task as completed if we still hold its lease"""
+        return self._finish(task_id, 'completed', None)
+
+    def fail(self, task_id, error_msg):
+        """Mark task as failed if we still hold its lease"""
+        return self._finish(task_id, 'failed', error_msg)
+
+    def _finish(self, task_id, status, error_msg):
+        finished = self.storage.execute("""
+            UPDATE processing_queue
+            SET status = ?, completed_at = ?, error_message = ?
+            WHERE id = ? AND assigned_to = ?
+        """, (status, now_ms(), error_msg, task_id, self.worker_id))
+
+        if not finished:
+            logger.warning(f"Lease on task {task_id} was lost before it could be marked {status}")
+        return finished == 1
+
+    @contextmanager
+    def heartbeat(self, task_id):
+        """Renew the lease in the background while the block runs
+
+        Yields an Event that is set once the lease is lost; the task
+        should check it between stages. Meanwhile every batch of buffered
+        rows is only written if the lease is still held in the same
+        transaction, so rows never land after another worker has
+        reclaimed the task and cleared its earlier rows.
+        """
+        stop = threading.Event()
+        lost = threading.Event()
+        interval = self.lease_seconds / 3
+
+        def guard(conn):
+            if self.holds_lease(conn, task_id):
+                return True
+            lost.set()
+            return False
+
+        def beat():
+            try:
+                while not stop.wait(interval):
+                    try:
+                        if not self.renew(task_id):
+                            logger.warning(f"Lost lease on task {task_id}")
+                            lost.set()
+                            return
+                    except Exception as e:
+                        logger.error(f"Failed to renew lease on task {task_id}: {e}")
+            finally:
+                self.storage.release()
+
+        thread = threading.Thread(target=beat, name=f"lease-{task_id}", daemon=True)
+        thread.start()
+        self.storage.write_guard = guard
+        try:
+            yield lost
+        finally:
+            self.storage.write_guard = None
+            stop.set()
+            thread.join()
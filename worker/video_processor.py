@@ -8,73 +8,80 @@ import os
 import sys
 import time
 import json
-import sqlite3
 import logging
 import subprocess
+import multiprocessing
+import wave
+import shutil
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import cv2
 import numpy as np
 from urllib.parse import urlparse
 
+# Shared modules are copied next to this script in the container image
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+
+from decoders import make_decoder
+from frame_pipeline import ordered_map, pipeline_settings
+from storage import Storage
+from frame_archive import FrameArchiveWriter
+from streaming import StreamingDecoder, StreamingUnsupported
+from task_queue import LeaseLost, TaskQueue
+from media_cache import MediaCache, hash_file
+from sampling import AdaptiveSampler, DuplicateFilter
+from audio_features import SILENCE_DB, analyze_segments, segment_features
+from chunking import ChunkJob, chunk_settings, merge_chunks, plan_chunks, run_chunks
+from work_dir import WorkDir
+from metrics import Metrics
+from profiling import profile_settings, profiled
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class VideoProcessor:
-    def __init__(self, db_path="/data/video_memory.db"):
+    def __init__(self, db_path="/data/video_memory.db", decoder_backend=None, metrics_port=None):
         self.db_path = db_path
-        self.work_dir = Path("/tmp/mnemo_work")
-        self.work_dir.mkdir(exist_ok=True)
+        self.storage = Storage(db_path)
+        self.tasks = TaskQueue(self.storage)
+        
+        if metrics_port is None:
+            metrics_port = int(os.environ.get("MNEMO_METRICS_PORT", "9102"))
+        self.metrics = Metrics("worker", metrics_port)
+        self.metrics.track_storage(self.storage)
+        self.profile_all, self.profile_dir = profile_settings(db_path)
+        self.decoder_backend = decoder_backend or os.environ.get("MNEMO_DECODER")
+        self.frame_workers, self.frame_queue_depth = pipeline_settings()
+        self.stream_ingest = os.environ.get("MNEMO_STREAM_INGEST", "1") == "1"
+        self.frame_format = os.environ.get("MNEMO_FRAME_FORMAT", "pack")
+        self.frame_array_width = int(os.environ.get("MNEMO_FRAME_ARRAY_WIDTH", "0")) or None
+        self.frame_pyramid = os.environ.get("MNEMO_FRAME_PYRAMID", "full,640,320g,160")
+        self.sampling = os.environ.get("MNEMO_SAMPLING", "fixed")
+        self.dedup = os.environ.get("MNEMO_DEDUP", "0") == "1"
+        # Quick level: at most one keyframe per 1/rate seconds, coarse audio segments
+        self.quick_frame_rate = float(os.environ.get("MNEMO_QUICK_FRAME_RATE", "0.5"))
+        self.quick_segment_duration = float(os.environ.get("MNEMO_QUICK_SEGMENT_SECONDS", "10"))
+        # Chunked mode: long videos are split into time ranges decoded by a process pool
+        self.chunked = os.environ.get("MNEMO_CHUNKED", "0") == "1"
+        self.chunk_seconds, self.chunk_workers, self.chunk_retries = chunk_settings()
+        self.workspace = WorkDir(self.storage)
+        self.work_dir = self.workspace.root
+        
+        self.cache = None
+        if os.environ.get("MNEMO_CACHE", "1") == "1":
+            cache_dir = os.environ.get("MNEMO_CACHE_DIR", str(self.work_dir / ".cache"))
+            self.cache = MediaCache(self.storage, cache_dir)
         
-    def connect_db(self):
-        """Connect to SQLite database"""
-        return sqlite3.connect(self.db_path)
-    
     def get_next_task(self):
-        """Get next download task from queue"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        
-        # Get pending download task
-        cursor.execute("""
-            SELECT id, video_id FROM processing_queue 
-            WHERE task_type = 'download' AND status = 'pending'
-            ORDER BY priority DESC, created_at ASC
-            LIMIT 1
-        """)
-        
-        task = cursor.fetchone()
-        if task:
-            task_id, video_id = task
-            # Mark as processing
-            cursor.execute("""
-                UPDATE processing_queue 
-                SET status = 'processing', started_at = ?
-                WHERE id = ?
-            """, (int(time.time() * 1000), task_id))
-            conn.commit()
-            
-            # Get video URL
-            cursor.execute("SELECT filename FROM video_metadata WHERE video_id = ?", (video_id,))
-            video_url = cursor.fetchone()[0]
-            
-            conn.close()
-            return task_id, video_id, video_url
-        
-        conn.close()
-        return None, None, None
+        """Claim the next download task from the queue under a lease"""
+        return self.tasks.claim('download')
     
-    def download_video(self, video_url, video_id):
-        """Download video using yt-dlp"""
-        output_path = self.work_dir / f"{video_id}.mp4"
-        
-        logger.info(f"Downloading video: {video_url}")
-        
-        # Use yt-dlp to download video
-        cmd = [
-            "yt-dlp",
+    def yt_dlp_args(self):
+        """Format selection and authentication options shared by every yt-dlp call"""
+        args = [
             "-f", "best[ext=mp4]/best",
-            "-o", str(output_path),
             "--no-playlist",
         ]
         
@@ -82,22 +89,71 @@ class VideoProcessor:
         cookies_path = Path("/data/youtube_cookies.txt")
         if cookies_path.exists():
             logger.info("Using YouTube cookies for authentication")
-            cmd.extend(["--cookies", str(cookies_path)])
+            args.extend(["--cookies", str(cookies_path)])
         
-        # Add video URL last
-        cmd.append(video_url)
+        return args
+    
+    def log_download_error(self, e):
+        logger.error(f"Failed to download video: {e.stderr}")
+        # If it's a sign-in error, provide helpful message
+        if e.stderr and "Sign in to confirm" in e.stderr:
+            logger.error("YouTube requires authentication. Please add cookies file at /data/youtube_cookies.txt")
+    
+    def download_video(self, video_url, video_id):
+        """Download video using yt-dlp"""
+        output_path = self.work_dir / f"{video_id}.mp4"
+        
+        logger.info(f"Downloading video: {video_url}")
+        
+        # Use yt-dlp to download video, URL last
+        cmd = ["yt-dlp", "-o", str(output_path), *self.yt_dlp_args(), video_url]
         
         try:
             result = subprocess.run(cmd, capture_output=True, text=True, check=True)
             logger.info(f"Video downloaded successfully: {output_path}")
             return output_path
         except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to download video: {e.stderr}")
-            # If it's a sign-in error, provide helpful message
-            if "Sign in to confirm" in e.stderr:
-                logger.error("YouTube requires authentication. Please add cookies file at /data/youtube_cookies.txt")
+            self.log_download_error(e)
             raise
     
+    def stream_video(self, video_url, video_id, sample_rate=1.0):
+        """Extract frames and audio while yt-dlp is still downloading
+        
+        Returns (video_path, frame_count, audio_path). frame_count is None
+        when the stream could not be decoded from a pipe; video_path is
+        None when nothing was downloaded, so the caller falls back to
+        download_video.
+        """
+        video_path = self.work_dir / f"{video_id}.mp4"
+        audio_path = self.work_dir / video_id / "audio" / "full_audio.wav"
+        
+        try:
+            decoder = StreamingDecoder(video_url, video_path, audio_path, self.yt_dlp_args())
+        except StreamingUnsupported as e:
+            logger.warning(f"Streaming ingest not available ({e}), downloading first")
+            return None, None, None
+        
+        logger.info(f"Streaming video: {video_url}")
+        
+        try:
+            frame_count = self.extract_frames(video_path, video_id, sample_rate, decoder=decoder)
+        except StreamingUnsupported as e:
+            logger.warning(f"Streaming ingest failed ({e}), processing the downloaded file instead")
+            frame_count = None
+        
+        try:
+            decoder.wait_for_download()
+        except subprocess.CalledProcessError as e:
+            self.log_download_error(e)
+            raise
+        
+        logger.info(f"Video downloaded successfully: {video_path}")
+        
+        if frame_count is None or not decoder.has_audio or not audio_path.exists():
+            audio_path = None
+        
+        return video_path, frame_count, audio_path
+    
     def extract_video_metadata(self, video_path):
         """Extract metadata from video file"""
         cap = cv2.VideoCapture(str(video_path))
@@ -113,48 +169,161 @@ class VideoProcessor:
         cap.release()
         return metadata
     
-    def extract_frames(self, video_path, video_id, sample_rate=1.0):
+    def extract_frames(self, video_path, video_id, sample_rate=1.0, decoder=None):
         """Extract frames from video at given sample rate (frames per second)"""
-        cap = cv2.VideoCapture(str(video_path))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_interval = int(fps / sample_rate)
+        if decoder is None:
+            decoder = make_decoder(video_path, self.decoder_backend)
         
         frames_dir = self.work_dir / video_id / "frames"
         frames_dir.mkdir(parents=True, exist_ok=True)
         
-        frame_count = 0
-        saved_count = 0
+        # Packed archive by default; "jpeg" keeps one file per frame
+        writer = None
+        if self.frame_format == "pack":
+            writer = FrameArchiveWriter(frames_dir, self.frame_array_width, self.frame_pyramid)
         
-        logger.info(f"Extracting frames at {sample_rate} fps (every {frame_interval} frames)")
+        saved_count = 0
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        sampler = AdaptiveSampler() if self.sampling == "adaptive" else None
+        # References to duplicates live in the archive index, so dedup needs the packed format
+        dedup = DuplicateFilter() if self.dedup and writer is not None else None
+        duplicate_count = 0
+        variance = 0.0
+        
+        with self.storage.stage(video_id, "frame", "sampling"), decoder, writer or nullcontext():
+            if sampler:
+                logger.info(f"Extracting frames adaptively at {sampler.min_rate}-{sampler.max_rate} fps "
+                            f"with {decoder.name} decoder")
+                frames = sampler.select(decoder.sampled_frames(sampler.max_rate))
+            else:
+                logger.info(f"Extracting frames at {sample_rate} fps with {decoder.name} decoder, "
+                            f"{self.frame_workers} workers, queue depth {self.frame_queue_depth}")
+                frames = decoder.sampled_frames(sample_rate)
             
-            if frame_count % frame_interval == 0:
-                # Save frame
-                frame_path = frames_dir / f"frame_{frame_count:06d}.jpg"
-                cv2.imwrite(str(frame_path), frame)
+            frames = self.metrics.timed_iter("decode", frames)
+            
+            # Duplicate check runs here: it depends on the last stored frame
+            jobs = ((frames_dir, writer, frame_number, timestamp, frame,
+                     dedup.check(frame_number, frame) if dedup else None)
+                    for frame_number, timestamp, frame in frames)
+            
+            # Decode on this thread, encode and score on the pool, persist in frame order
+            for frame_number, timestamp, frame_variance, payload, duplicate_of in ordered_map(
+                    self.encode_frame, jobs, self.frame_workers, self.frame_queue_depth):
+                change_score = sampler.change_scores.pop(frame_number, None) if sampler else None
+                
+                if duplicate_of is not None:
+                    # Near-duplicate of the last stored frame: reference it and reuse its score
+                    writer.add_reference(frame_number, timestamp, duplicate_of)
+                    self.store_frame_data(video_id, frame_number, timestamp, variance, change_score,
+                                          duplicate_of)
+                    duplicate_count += 1
+                    continue
                 
-                # Calculate simple importance score (variance of Laplacian for blur detection)
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+                variance = frame_variance
+                if writer is not None:
+                    writer.add(frame_number, timestamp, *payload)
                 
                 # Store frame data in database
-                self.store_frame_data(video_id, frame_count, frame_count/fps, variance)
+                self.store_frame_data(video_id, frame_number, timestamp, variance, change_score)
                 
                 saved_count += 1
+                self.metrics.count_frames()
                 
                 if saved_count % 10 == 0:
                     logger.info(f"Processed {saved_count} frames...")
             
-            frame_count += 1
+            logger.info(f"Extracted {saved_count} frames ({duplicate_count} near-duplicates referenced) "
+                        f"from {decoder.frames_read} decoded frames")
+            
+            if sampler:
+                self.store_sampling_report(video_id, sampler.summary())
         
-        cap.release()
-        logger.info(f"Extracted {saved_count} frames from {frame_count} total frames")
         return saved_count
     
+    def use_chunks(self, metadata):
+        """Whether a downloaded video is long enough to be worth chunking"""
+        return (self.chunked and self.frame_format == "pack" and self.chunk_workers > 1 and
+                metadata['duration'] >= 2 * self.chunk_seconds)
+    
+    def extract_frames_chunked(self, video_path, video_id, metadata, sample_rate=1.0):
+        """Extract frames of time-range chunks in parallel, then merge them in order
+        
+        Adaptive sampling and dedup restart at every chunk boundary, so each
+        chunk's first frame is always kept.
+        """
+        video_dir = self.work_dir / video_id
+        frames_dir = video_dir / "frames"
+        chunks_root = video_dir / "chunks"
+        
+        adaptive = self.sampling == "adaptive"
+        plan_rate = AdaptiveSampler().max_rate if adaptive else sample_rate
+        chunks = plan_chunks(metadata['frame_count'], metadata['fps'], plan_rate, self.chunk_seconds)
+        jobs = [
+            ChunkJob(str(video_path), str(chunks_root / f"chunk_{chunk.index:04d}"), chunk, sample_rate,
+                     self.decoder_backend, self.frame_array_width, self.frame_pyramid, adaptive, self.dedup)
+            for chunk in chunks
+        ]
+        
+        logger.info(f"Extracting frames in {len(chunks)} chunks of {self.chunk_seconds:.0f}s "
+                    f"with {min(self.chunk_workers, len(chunks))} processes")
+        with self.metrics.time("chunks"):
+            results = run_chunks(jobs, self.chunk_workers, self.chunk_retries)
+        
+        saved_count = duplicate_count = 0
+        with self.storage.stage(video_id, "frame", "sampling"), \
+                FrameArchiveWriter(frames_dir, self.frame_array_width, self.frame_pyramid) as writer:
+            merge_chunks(results, [job.chunk_dir for job in jobs], writer)
+            
+            for result in results:
+                for frame_number, timestamp, variance, change_score, duplicate_of in result.rows:
+                    self.store_frame_data(video_id, frame_number, timestamp, variance, change_score,
+                                          duplicate_of)
+                    if duplicate_of is None:
+                        saved_count += 1
+                        self.metrics.count_frames()
+                    else:
+                        duplicate_count += 1
+            
+            if adaptive:
+                summaries = [result.sampling for result in results]
+                summary = dict(summaries[0])
+                summary["candidates"] = sum(s["candidates"] for s in summaries)
+                summary["kept"] = sum(s["kept"] for s in summaries)
+                summary["timestamps"] = [t for s in summaries for t in s["timestamps"]]
+                summary["chunks"] = len(summaries)
+                self.store_sampling_report(video_id, summary)
+        
+        shutil.rmtree(chunks_root, ignore_errors=True)
+        
+        logger.info(f"Extracted {saved_count} frames ({duplicate_count} near-duplicates referenced) "
+                    f"from {sum(result.frames_read for result in results)} decoded frames "
+                    f"in {len(chunks)} chunks")
+        return saved_count
+    
+    def encode_frame(self, job):
+        """Encode one sampled frame and score its sharpness"""
+        frames_dir, writer, frame_number, timestamp, frame, duplicate_of = job
+        
+        if duplicate_of is not None:
+            return frame_number, timestamp, None, None, duplicate_of
+        
+        payload = None
+        with self.metrics.time("encode"):
+            if writer is not None:
+                payload = writer.encode(frame)
+            else:
+                # Save frame
+                frame_path = frames_dir / f"frame_{frame_number:06d}.jpg"
+                cv2.imwrite(str(frame_path), frame)
+        
+        # Calculate simple importance score (variance of Laplacian for blur detection)
+        with self.metrics.time("blur"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+        
+        return frame_number, timestamp, variance, payload, None
+    
     def extract_audio(self, video_path, video_id):
         """Extract audio from video and save as WAV file"""
         audio_dir = self.work_dir / video_id / "audio"
@@ -176,7 +345,8 @@ class VideoProcessor:
         ]
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            with self.metrics.time("audio_extract"):
+                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
             logger.info(f"Audio extracted successfully: {audio_path}")
             
             # Get audio duration and properties
@@ -188,8 +358,6 @@ class VideoProcessor:
     
     def analyze_audio_properties(self, audio_path):
         """Analyze basic audio properties"""
-        import wave
-        
         try:
             with wave.open(str(audio_path), 'rb') as wav:
                 frames = wav.getnframes()
@@ -209,52 +377,57 @@ class VideoProcessor:
             logger.error(f"Failed to analyze audio: {e}")
             return None
     
-    def extract_audio_segments(self, audio_path, video_id, segment_duration=1.0):
-        """Extract audio segments matching video frame extraction"""
+    def extract_audio_segments(self, audio_path, video_id, segment_duration=1.0, write_files=True):
+        """Extract audio segments matching video frame extraction
+        
+        Reads full_audio.wav once, front to back, and slices it in process.
+        Each report records the segment's sample offset and length into the
+        full file, so write_files=False leaves them as virtual segments.
+        """
         segments_dir = self.work_dir / video_id / "audio" / "segments"
-        segments_dir.mkdir(parents=True, exist_ok=True)
+        if write_files:
+            segments_dir.mkdir(parents=True, exist_ok=True)
         
         logger.info(f"Extracting audio segments at {segment_duration}s intervals")
         
-        # Get audio duration
-        probe_cmd = [
-            "ffprobe", "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(audio_path)
-        ]
+        try:
+            # One vectorized pass for every segment's features and importance
+            with self.metrics.time("audio_features"):
+                features = analyze_segments(audio_path, segment_duration)
+        except Exception as e:
+            logger.error(f"Failed to analyze audio features: {e}")
+            features = None
         
         try:
-            duration_result = subprocess.run(probe_cmd, capture_output=True, text=True, check=True)
-            total_duration = float(duration_result.stdout.strip())
-            
-            segment_count = 0
-            timestamp = 0
-            
-            while timestamp < total_duration:
-                segment_path = segments_dir / f"audio_segment_{int(timestamp):06d}.wav"
-                
-                # Extract segment using ffmpeg
-                cmd = [
-                    "ffmpeg",
-                    "-i", str(audio_path),
-                    "-ss", str(timestamp),
-                    "-t", str(segment_duration),
-                    "-acodec", "copy",
-                    "-y",
-                    str(segment_path)
-                ]
-                
-                subprocess.run(cmd, capture_output=True, check=True)
-                
-                # Store audio segment data
-                self.store_audio_segment_data(video_id, segment_count, timestamp, segment_duration)
+            with wave.open(str(audio_path), 'rb') as wav, \
+                    self.storage.stage(video_id, "audio"), self.metrics.time("audio_segments"):
+                params = wav.getparams()
+                rate = params.framerate
+                total_samples = params.nframes
+                total_duration = total_samples / float(rate)
                 
-                segment_count += 1
-                timestamp += segment_duration
+                segment_count = 0
+                timestamp = 0
                 
-                if segment_count % 10 == 0:
-                    logger.info(f"Processed {segment_count} audio segments...")
+                while timestamp < total_duration:
+                    start_sample = int(round(timestamp * rate))
+                    end_sample = min(int(round((timestamp + segment_duration) * rate)), total_samples)
+                    if write_files:
+                        data = wav.readframes(end_sample - start_sample)
+                        segment_path = segments_dir / f"audio_segment_{int(timestamp):06d}.wav"
+                        with wave.open(str(segment_path), 'wb') as segment:
+                            segment.setparams(params)
+                            segment.writeframes(data)
+                    
+                    # Store audio segment data
+                    self.store_audio_segment_data(video_id, segment_count, timestamp, segment_duration,
+                                                  start_sample, end_sample - start_sample, features)
+                    
+                    segment_count += 1
+                    timestamp = segment_count * segment_duration
+                    
+                    if segment_count % 100 == 0:
+                        logger.info(f"Processed {segment_count} audio segments...")
             
             logger.info(f"Extracted {segment_count} audio segments")
             return segment_count
@@ -263,11 +436,9 @@ class VideoProcessor:
             logger.error(f"Failed to extract audio segments: {e}")
             return 0
     
-    def store_audio_segment_data(self, video_id, segment_number, timestamp, duration):
-        """Store audio segment data in database"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        
+    def store_audio_segment_data(self, video_id, segment_number, timestamp, duration,
+                                 sample_offset=None, sample_count=None, analysis=None):
+        """Queue audio segment data for the batched writer"""
         # Create audio gapper report
         gapper_id = f"audio_gapper_{segment_number}"
         features = {
@@ -275,13 +446,18 @@ class VideoProcessor:
             "has_audio": True,
             "timestamp": timestamp
         }
-        
-        cursor.execute("""
-            INSERT INTO gapper_reports 
-            (video_id, gapper_type, timestamp, gapper_id, start_frame, 
-             end_frame, summary, importance, features)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        if sample_offset is not None:
+            # Virtual segment: offset/length into full_audio.wav
+            features["sample_offset"] = sample_offset
+            features["sample_count"] = sample_count
+        
+        importance = 0.5  # Default importance when the audio could not be analyzed
+        if analysis is not None and segment_number < len(analysis["importance"]):
+            features.update(segment_features(analysis, segment_number))
+            features["has_audio"] = bool(analysis["rms_db"][segment_number] > SILENCE_DB)
+            importance = float(analysis["importance"][segment_number])
+        
+        self.storage.add_gapper_report(
             video_id, 
             "audio", 
             int(timestamp * 1000),
@@ -289,31 +465,25 @@ class VideoProcessor:
             int(timestamp * 30),  # Approximate frame number
             int((timestamp + duration) * 30),
             f"Audio segment at {timestamp:.2f}s",
-            0.5,  # Default importance, will be updated with speech detection
-            json.dumps(features)
-        ))
-        
-        conn.commit()
-        conn.close()
+            importance,
+            features
+        )
     
-    def store_frame_data(self, video_id, frame_number, timestamp, importance):
-        """Store frame data as a gapper report"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        
+    def store_frame_data(self, video_id, frame_number, timestamp, importance, change_score=None,
+                         duplicate_of=None):
+        """Queue frame data as a gapper report for the batched writer"""
         # Create a simple gapper report for the frame
         gapper_id = f"frame_gapper_{frame_number}"
         features = {
             "blur_variance": float(importance),
             "has_content": bool(importance > 100)  # Convert numpy bool to Python bool
         }
+        if change_score is not None:
+            features["change_score"] = change_score
+        if duplicate_of is not None:
+            features["duplicate_of"] = duplicate_of
         
-        cursor.execute("""
-            INSERT INTO gapper_reports 
-            (video_id, gapper_type, timestamp, gapper_id, start_frame, 
-             end_frame, summary, importance, features)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        self.storage.add_gapper_report(
             video_id, 
             "frame", 
             int(timestamp * 1000),  # Convert to milliseconds
@@ -322,134 +492,261 @@ class VideoProcessor:
             frame_number,
             f"Frame at {timestamp:.2f}s",
             min(importance / 1000, 1.0),  # Normalize importance
-            json.dumps(features)
-        ))
-        
-        conn.commit()
-        conn.close()
+            features
+        )
     
-    def create_video_summary(self, video_id, metadata, frame_count, audio_segments=0):
-        """Create a simple video summary"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
+    def store_sampling_report(self, video_id, summary):
+        """Record the adaptive sampling budget and the timestamps it chose"""
+        self.storage.add_gapper_report(
+            video_id,
+            "sampling",
+            0,
+            "sampling_summary",
+            0,
+            0,
+            f"Adaptive sampling kept {summary['kept']} of {summary['candidates']} candidate frames",
+            0.0,
+            summary
+        )
+    
+    def create_video_summary(self, video_id, metadata, frame_count, audio_segments=0,
+                             processing_level="standard"):
+        """Create a simple video summary
+        
+        A quick pass leaves the video in 'preview' status, so downstream
+        extractors wait for the standard pass that refines it. The level
+        is stored with the video, so extractors pick the tier of the
+        frames actually on disk.
+        """
+        quick = processing_level == "quick"
+        # Make sure every buffered report is written before the video is marked completed
+        self.storage.flush()
         
         # Create root memory node
         root_node_id = f"{video_id}_root"
         
-        cursor.execute("""
-            INSERT INTO memory_nodes 
-            (video_id, node_level, node_id, parent_id, start_time, 
-             end_time, summary, importance, narrative_tags)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            video_id,
-            4,  # Meta level
-            root_node_id,
-            None,
-            0.0,
-            metadata['duration'],
-            f"Video with {frame_count} extracted frames, {audio_segments} audio segments, {metadata['duration']:.1f} seconds long",
-            1.0,
-            json.dumps(["full_video", "processed"])
-        ))
-        
-        # Update video metadata
-        cursor.execute("""
-            UPDATE video_metadata 
-            SET duration_seconds = ?, fps = ?, width = ?, height = ?, 
-                processed_at = ?, status = 'completed'
-            WHERE video_id = ?
-        """, (
-            metadata['duration'],
-            metadata['fps'],
-            metadata['width'],
-            metadata['height'],
-            int(time.time() * 1000),
-            video_id
-        ))
-        
-        conn.commit()
-        conn.close()
+        with self.storage.transaction() as conn:
+            # REPLACE: a standard pass overwrites the root left by a quick preview
+            conn.execute("""
+                INSERT OR REPLACE INTO memory_nodes 
+                (video_id, node_level, node_id, parent_id, start_time, 
+                 end_time, summary, importance, narrative_tags)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                video_id,
+                4,  # Meta level
+                root_node_id,
+                None,
+                0.0,
+                metadata['duration'],
+                f"{'Keyframe preview' if quick else 'Video'} with {frame_count} extracted frames, "
+                f"{audio_segments} audio segments, {metadata['duration']:.1f} seconds long",
+                1.0,
+                json.dumps(["full_video", "preview" if quick else "processed"])
+            ))
+            
+            # Update video metadata
+            conn.execute("""
+                UPDATE video_metadata 
+                SET duration_seconds = ?, fps = ?, width = ?, height = ?, 
+                    processed_at = ?, status = ?, processing_level = ?
+                WHERE video_id = ?
+            """, (
+                metadata['duration'],
+                metadata['fps'],
+                metadata['width'],
+                metadata['height'],
+                int(time.time() * 1000),
+                'preview' if quick else 'completed',
+                processing_level,
+                video_id
+            ))
     
     def complete_task(self, task_id):
         """Mark task as completed"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE processing_queue 
-            SET status = 'completed', completed_at = ?
-            WHERE id = ?
-        """, (int(time.time() * 1000), task_id))
-        
-        conn.commit()
-        conn.close()
+        self.tasks.complete(task_id)
     
     def fail_task(self, task_id, error_msg):
         """Mark task as failed"""
-        conn = self.connect_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE processing_queue 
-            SET status = 'failed', completed_at = ?, error_message = ?
-            WHERE id = ?
-        """, (int(time.time() * 1000), error_msg, task_id))
-        
-        conn.commit()
-        conn.close()
+        self.tasks.fail(task_id, error_msg)
     
     def process_one(self):
         """Process one video from the queue"""
-        task_id, video_id, video_url = self.get_next_task()
+        if not self.workspace.has_room():
+            # Leave the task queued rather than run out of disk halfway through it
+            logger.warning(f"Work directory over quota or below {self.workspace.min_free_bytes >> 20} MB free, "
+                           f"pausing downloads")
+            return False
+        
+        with self.metrics.time("claim"):
+            self.metrics.set_queue_depth(self.tasks.pending('download'))
+            task_id, video_id, video_url, processing_level = self.get_next_task()
         
         if not task_id:
             return False
         
-        logger.info(f"Processing video {video_id} from {video_url}")
+        logger.info(f"Processing video {video_id} from {video_url} at {processing_level} level "
+                    f"as {self.tasks.worker_id}")
+        
+        profiling = nullcontext()
+        if self.profile_all or self.tasks.profile_requested(task_id):
+            profiling = profiled(self.metrics, self.storage, video_id, f"worker_task_{task_id}", self.profile_dir)
         
+        with self.tasks.heartbeat(task_id) as lease_lost, profiling:
+            return self.process_task(task_id, video_id, video_url, processing_level, lease_lost)
+    
+    def check_lease(self, task_id, lease_lost):
+        """Stop before the next stage once another worker has taken the task over"""
+        if lease_lost is not None and lease_lost.is_set():
+            raise LeaseLost(f"Lease on task {task_id} was lost")
+    
+    def process_task(self, task_id, video_id, video_url, processing_level="standard", lease_lost=None):
+        """Download and extract one claimed video
+        
+        The quick level decodes keyframes only and writes coarse, virtual
+        audio segments; a later standard task for the same video replaces
+        its reports. If the lease is lost the task stops between stages,
+        leaving the video to the worker that reclaimed it.
+        """
+        quick = processing_level == "quick"
+        started = time.perf_counter()
         try:
-            # Download video
-            video_path = self.download_video(video_url, video_id)
+            self.workspace.acquire(video_id, "worker")
+            
+            # Rows from an earlier pass (a preview, or a worker that died mid-task)
+            self.storage.discard(video_id, ("frame", "sampling", "audio"))
+            
+            if self.cache:
+                # Cached entries come from standard passes, which also satisfy a quick request
+                entry = self.cache.lookup_url(video_url)
+                if entry and self.reuse_cached(task_id, video_id, entry, lease_lost):
+                    return True
+            
+            video_path = frame_count = None
+            
+            # Chunked mode needs the whole file to seek in, so it replaces streaming
+            if self.stream_ingest and not quick and not self.chunked:
+                # Extract frames and audio while the download is running
+                with self.metrics.time("stream"):
+                    video_path, frame_count, audio_path = self.stream_video(video_url, video_id)
+            
+            if video_path is None:
+                # Download video
+                with self.metrics.time("download"):
+                    video_path = self.download_video(video_url, video_id)
+            
+            content_hash = hash_file(video_path) if self.cache else None
+            
+            if self.cache and frame_count is None:
+                # Same media under a different URL: skip extraction entirely
+                entry = self.cache.lookup_content(content_hash)
+                if entry and self.reuse_cached(task_id, video_id, entry, lease_lost):
+                    self.cache.remember_url(video_url, content_hash)
+                    os.remove(video_path)
+                    return True
+            
+            self.check_lease(task_id, lease_lost)
             
             # Extract metadata
             metadata = self.extract_video_metadata(video_path)
             logger.info(f"Video metadata: {metadata}")
             
-            # Extract frames (1 frame per second)
-            frame_count = self.extract_frames(video_path, video_id, sample_rate=1.0)
+            if frame_count is None and quick:
+                # Keyframes only: the codec skips every other frame undecoded
+                frame_count = self.extract_frames(video_path, video_id, self.quick_frame_rate,
+                                                  decoder=make_decoder(video_path, "keyframes"))
+                audio_path, audio_info = self.extract_audio(video_path, video_id)
+            elif frame_count is None and self.use_chunks(metadata):
+                # Audio is one ffmpeg pass; run it alongside the chunk processes
+                with ThreadPoolExecutor(max_workers=1) as audio_pool:
+                    audio_future = audio_pool.submit(self.extract_audio, video_path, video_id)
+                    frame_count = self.extract_frames_chunked(video_path, video_id, metadata, sample_rate=1.0)
+                    audio_path, audio_info = audio_future.result()
+            elif frame_count is None:
+                # Extract frames (1 frame per second)
+                frame_count = self.extract_frames(video_path, video_id, sample_rate=1.0)
+                
+                # Extract audio
+                audio_path, audio_info = self.extract_audio(video_path, video_id)
+            else:
+                audio_info = self.analyze_audio_properties(audio_path) if audio_path else None
             
-            # Extract audio
-            audio_path, audio_info = self.extract_audio(video_path, video_id)
+            self.check_lease(task_id, lease_lost)
             
             if audio_path and audio_info:
                 # Extract audio segments synchronized with frames
-                audio_segments = self.extract_audio_segments(audio_path, video_id, segment_duration=1.0)
+                if quick:
+                    audio_segments = self.extract_audio_segments(audio_path, video_id,
+                                                                 self.quick_segment_duration,
+                                                                 write_files=False)
+                else:
+                    audio_segments = self.extract_audio_segments(audio_path, video_id, segment_duration=1.0)
                 logger.info(f"Extracted {audio_segments} audio segments")
             else:
                 logger.warning("No audio track found in video")
                 audio_segments = 0
             
+            self.check_lease(task_id, lease_lost)
+            
             # Create summary including audio info
-            self.create_video_summary(video_id, metadata, frame_count, audio_segments)
+            self.create_video_summary(video_id, metadata, frame_count, audio_segments, processing_level)
+            
+            if self.cache and not quick:
+                if self.cache.lookup_content(content_hash):
+                    self.cache.remember_url(video_url, content_hash)
+                else:
+                    self.cache.store(video_url, content_hash, video_id, self.work_dir / video_id,
+                                     metadata, frame_count, audio_segments)
             
             # Mark task as completed
             self.complete_task(task_id)
             
-            # Cleanup - only remove the video file, keep frames for motion extraction
+            # Cleanup - only remove the video file, keep frames until their consumers release them
             os.remove(video_path)
-            logger.info(f"Keeping frames for motion extraction: {self.work_dir / video_id}")
+            self.metrics.task_finished("success", frame_count, time.perf_counter() - started)
+            if quick:
+                # Consumers wait for the standard pass, which extracts its own frames
+                self.workspace.release(video_id, "worker")
+            else:
+                self.workspace.publish(video_id, "worker")
+                logger.info(f"Keeping frames for {', '.join(self.workspace.consumers) or 'no consumers'}: "
+                            f"{self.work_dir / video_id}")
             
             logger.info(f"Successfully processed video {video_id}")
             return True
             
+        except LeaseLost as e:
+            # The new owner holds the same work directory ref and replaces our rows
+            logger.warning(f"Abandoning video {video_id}: {e}")
+            self.metrics.task_finished("abandoned")
+            return True
         except Exception as e:
             import traceback
             error_msg = f"Failed to process video {video_id}: {str(e)}\n{traceback.format_exc()}"
             logger.error(error_msg)
             self.fail_task(task_id, str(e))
+            self.workspace.release(video_id, "worker")
+            self.metrics.task_finished("failure")
             return True
     
+    def reuse_cached(self, task_id, video_id, entry, lease_lost=None):
+        """Complete a task from a cache entry instead of reprocessing
+        
+        Entries hold standard-level artifacts, so the video is recorded at
+        that level whatever level the task asked for. Returns False, having
+        done nothing, if the entry turned out to be stale.
+        """
+        if not self.cache.materialize(entry, video_id, self.work_dir / video_id):
+            return False
+        self.check_lease(task_id, lease_lost)
+        self.create_video_summary(video_id, entry["metadata"], entry["frame_count"], entry["audio_segments"],
+                                  "standard")
+        self.complete_task(task_id)
+        self.workspace.publish(video_id, "worker")
+        self.metrics.task_finished("cached")
+        logger.info(f"Successfully processed video {video_id} from cache")
+        return True
+    
     def run(self):
         """Run the processor in a loop"""
         logger.info("Video processor started")
@@ -465,11 +762,48 @@ class VideoProcessor:
                     
             except KeyboardInterrupt:
                 logger.info("Shutting down...")
+                self.storage.close()
                 break
             except Exception as e:
                 logger.error(f"Unexpected error: {e}")
                 time.sleep(5)
 
+def run_worker(db_path, slot=0):
+    """Entry point of one pool process; each serves metrics on its own port
+    
+    Prometheus scrapes 9102-9105, so pools of more than four processes
+    need more targets in monitoring/prometheus/prometheus.yml.
+    """
+    base_port = int(os.environ.get("MNEMO_METRICS_PORT", "9102"))
+    VideoProcessor(db_path=db_path, metrics_port=base_port + slot if base_port else 0).run()
+
+def run_pool(db_path, workers):
+    """Run several worker processes, restarting any that die"""
+    logger.info(f"Starting video worker pool with {workers} processes")
+    
+    processes = {}
+    try:
+        while True:
+            for slot in range(workers):
+                process = processes.get(slot)
+                if process is None or not process.is_alive():
+                    if process is not None:
+                        logger.warning(f"Worker {slot} exited with {process.exitcode}, restarting")
+                    process = multiprocessing.Process(target=run_worker, args=(db_path, slot),
+                                                      name=f"video-worker-{slot}")
+                    process.start()
+                    processes[slot] = process
+            time.sleep(5)
+    except KeyboardInterrupt:
+        logger.info("Shutting down worker pool...")
+        for process in processes.values():
+            process.join()
+
 if __name__ == "__main__":
-    processor = VideoProcessor()
-    processor.run()
\ No newline at end of file
+    db_path = os.environ.get("DATABASE_PATH", "/data/video_memory.db")
+    workers = int(os.environ.get("MNEMO_WORKERS", "1"))
+    
+    if workers > 1:
+        run_pool(db_path, workers)
+    else:
+        run_worker(db_path)
\ No newline at end of file